@@ -0,0 +1,383 @@
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+REPLY_FIELDS = ('position', 'pid', 'author', 'uid', 'time', 'content')
+CJK = '\u3400-\u9fff\uf900-\ufaff'
+_token_pattern = re.compile(f'([{CJK}]+)|([^\\W{CJK}]+)')
+
+
+def tokenize(text, query=False):
+    """
+    全文索引分词：中文按相邻两字切分（二元组），其他按单词切分并转为小写
+
+    :param text: 文本
+    :param query: 是否用于查询，默认False
+    :return:
+        list: 词列表；索引时每段中文的末字（单字，用于查询单字）统一放在最后，不打断相邻词的位置，
+            如 '这个教程python很好' → ['这个', '个教', '教程', 'python', '很好', '程', '好']，
+            因此 '教程python'、'python很好' 都能按短语匹配；查询时不含单字
+    """
+    tokens = []
+    unigrams = []
+    for chinese, word in _token_pattern.findall(text):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(chinese[i:i + 2] for i in range(len(chinese) - 1))
+        unigrams.append(chinese[-1])
+    return tokens if query else tokens + unigrams
+
+
+class ThreadArchive:
+    """
+    帖子本地存档（SQLite）
+
+    回复按 pid 保存，同步时只获取上次存档之后的页，存档内容可以离线查询
+    """
+
+    def __init__(self, path, api=None):
+        """
+        初始化
+
+        :param path: 数据库文件路径
+        :param api: 用于同步的 WebAPI，默认None，即只离线查询
+        """
+        self.api = api
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS threads (
+                    tid INTEGER PRIMARY KEY, title TEXT, pid INTEGER, first_paragraph TEXT, reply_count INTEGER,
+                    author TEXT, uid INTEGER, create_time INTEGER, page_size INTEGER, sync_time INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS replies (
+                    pid INTEGER PRIMARY KEY, tid INTEGER, position INTEGER, author TEXT, uid INTEGER, time INTEGER,
+                    content TEXT
+                );
+                CREATE INDEX IF NOT EXISTS replies_tid ON replies (tid, position);
+                CREATE INDEX IF NOT EXISTS replies_uid ON replies (uid);
+                CREATE VIRTUAL TABLE IF NOT EXISTS reply_index USING fts5 (content, author);
+                CREATE TABLE IF NOT EXISTS indexed (tid INTEGER PRIMARY KEY, position INTEGER);
+            """)
+
+    def close(self):
+        self.db.close()
+
+    def sync_thread(self, tid, refresh=False):
+        """
+        同步帖子到存档
+
+        :param tid: 帖子tid
+        :param refresh: 是否从第一页重新获取，以更新被编辑过的回复，默认False，即只获取新回复
+        :return:
+            int: 新增或更新的回复数
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+        """
+        thread = self.get_thread_info(tid)
+        first_page = None
+        if thread is None:  # 首次同步，帖子信息和第一页回复一起获取
+            first_page = self.api.get_thread(tid)
+            if first_page is None:
+                return 0
+            thread = dict(first_page['info'], page_size=first_page['page_size'])
+        last_position = 0 if refresh else self.last_position(tid)
+        page_size = thread['page_size']
+        page = last_position // page_size + 1
+        count = 0
+        located = False
+        while True:
+            if page == 1 and first_page is not None:
+                result, first_page = first_page, None
+            else:
+                result = self.api.get_reply_page(tid, page)
+            if result is None:
+                break
+            replies = result['replies']
+            if not located and page > 1 and replies and replies[0]['position'] > last_position + 1:  # 有楼层被删除，往前一页
+                page -= 1
+                continue
+            located = True
+            page_size = result['page_size']
+            thread['reply_count'] = result['total'] - 1
+            new_replies = [reply for reply in replies if reply['position'] > last_position]
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO replies (tid, position, pid, author, uid, time, content) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(tid, *(reply[key] for key in REPLY_FIELDS)) for reply in new_replies]
+                )
+            count += len(new_replies)
+            if new_replies:
+                last_position = new_replies[-1]['position']
+            if not result['hasNext']:
+                break
+            page += 1
+        thread.update({'page_size': page_size, 'sync_time': int(time.time())})
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO threads (tid, title, pid, first_paragraph, reply_count, author, uid, '
+                'create_time, page_size, sync_time) VALUES (:tid, :title, :pid, :first_paragraph, :reply_count, '
+                ':author, :uid, :create_time, :page_size, :sync_time)',
+                thread
+            )
+        return count
+
+    def last_position(self, tid):
+        """
+        :param tid: 帖子tid
+        :return:
+            int: 已存档的最后楼层，没有存档时为0
+        """
+        row = self.db.execute('SELECT MAX(position) FROM replies WHERE tid = ?', (tid,)).fetchone()
+        return row[0] or 0
+
+    def get_thread_info(self, tid):
+        """
+        获取存档中的帖子信息
+
+        :param tid: 帖子tid
+        :return:
+            dict: 格式同 WebAPI.get_thread_info，另有 page_size 和 sync_time（最后同步时间戳）
+            没有存档时返回 None
+        """
+        row = self.db.execute('SELECT * FROM threads WHERE tid = ?', (tid,)).fetchone()
+        return dict(row) if row else None
+
+    def get_replies(self, tid, start=1, end=None):
+        """
+        获取存档中的回复
+
+        :param tid: 帖子tid
+        :param start: 起始楼层，默认1
+        :param end: 结束楼层（含），默认None，即到最后
+        :return:
+            list: 回复列表，按楼层排序，格式同 WebAPI.get_reply_all
+        """
+        rows = self.db.execute(
+            f'SELECT {", ".join(REPLY_FIELDS)} FROM replies WHERE tid = ? AND position >= ? AND position <= ? '
+            'ORDER BY position',
+            (tid, start, end if end is not None else 2 ** 62)
+        )
+        return [dict(row) for row in rows]
+
+    def get_user_replies(self, uid, tid=None):
+        """
+        获取存档中某用户的所有回复
+
+        :param uid: 用户uid
+        :param tid: 只查询此帖子，默认None，即所有存档的帖子
+        :return:
+            list: 回复列表，按时间排序，格式同 WebAPI.get_reply_all，另有 tid
+        """
+        sql = f'SELECT tid, {", ".join(REPLY_FIELDS)} FROM replies WHERE uid = ?'
+        params = [uid]
+        if tid is not None:
+            sql += ' AND tid = ?'
+            params.append(tid)
+        rows = self.db.execute(sql + ' ORDER BY time', params)
+        return [dict(row) for row in rows]
+
+    def index_thread(self, tid, rebuild=False):
+        """
+        将存档中的帖子回复加入全文索引
+
+        :param tid: 帖子tid
+        :param rebuild: 是否重建此帖子的索引，默认False，即只索引上次之后新增的楼层；
+            sync_thread(refresh=True) 更新了被编辑的回复后需重建
+        :return:
+            int: 新索引的回复数
+        """
+        row = self.db.execute('SELECT position FROM indexed WHERE tid = ?', (tid,)).fetchone()
+        last_position = 0 if rebuild or row is None else row[0]
+        rows = self.db.execute(
+            'SELECT pid, position, author, content FROM replies WHERE tid = ? AND position > ? ORDER BY position',
+            (tid, last_position)
+        ).fetchall()
+        if not rows:
+            return 0
+        with self.db:
+            if rebuild:
+                self.db.execute('DELETE FROM reply_index WHERE rowid IN (SELECT pid FROM replies WHERE tid = ?)', (tid,))
+            self.db.executemany(
+                'INSERT INTO reply_index (rowid, content, author) VALUES (?, ?, ?)',
+                [(row['pid'], ' '.join(tokenize(row['content'] or '')), ' '.join(tokenize(row['author'] or '')))
+                 for row in rows]
+            )
+            self.db.execute('INSERT OR REPLACE INTO indexed (tid, position) VALUES (?, ?)', (tid, rows[-1]['position']))
+        return len(rows)
+
+    def search(self, query, filters=None, limit=100):
+        """
+        在全文索引中搜索回复
+
+        :param query: 关键词，多个关键词用空格分隔，需同时出现在回复内容或作者中
+        :param filters: 筛选条件，默认None，可包含：
+            - tid (int): 帖子tid
+            - uid (int): 用户uid
+            - start_time (int): 最早回复时间戳
+            - end_time (int): 最晚回复时间戳
+        :param limit: 最多返回的结果数，默认100
+        :return:
+            list: 回复列表，按相关度排序，格式同 WebAPI.get_reply_all，另有 tid
+        :note:
+            只能搜索到已经 index_thread 的帖子
+        """
+        terms = []
+        for word in query.split():
+            tokens = tokenize(word, query=True)
+            if tokens:
+                terms.append('"' + ' '.join(tokens) + '"')
+            for chinese, _ in _token_pattern.findall(word):
+                if len(chinese) == 1:  # 单字，匹配以此字开头的二元组或末字
+                    terms.append(f'"{chinese}"*')
+        if not terms:
+            return []
+        filters = filters or {}
+        sql = (f'SELECT r.tid, {", ".join("r." + key for key in REPLY_FIELDS)} FROM reply_index '
+               'JOIN replies r ON r.pid = reply_index.rowid WHERE reply_index MATCH ?')
+        params = [' '.join(terms)]
+        for key, condition in (('tid', 'r.tid = ?'), ('uid', 'r.uid = ?'), ('start_time', 'r.time >= ?'),
+                               ('end_time', 'r.time <= ?')):
+            if filters.get(key) is not None:
+                sql += ' AND ' + condition
+                params.append(filters[key])
+        rows = self.db.execute(sql + ' ORDER BY reply_index.rank LIMIT ?', params + [limit])
+        return [dict(row) for row in rows]
+
+
+DARKROOM_FIELDS = ('name', 'uid', 'action', 'expiration', 'time', 'reason')
+FORUM_TZ = timezone(timedelta(hours=8))  # 论坛显示的时间为北京时间
+
+
+def parse_forum_time(text):
+    """
+    解析论坛显示的时间，如 2025-1-9 08:05
+
+    :return:
+        int: 时间戳（秒），无法解析时返回 None
+    """
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return int(datetime.strptime(text.strip(), fmt).replace(tzinfo=FORUM_TZ).timestamp())
+        except ValueError:
+            continue
+    return None
+
+
+class DarkroomArchive:
+    """
+    小黑屋完整历史存档（SQLite）
+
+    记录按 uid+操作时间保存；首次同步沿“更多”逐页获取全部历史，
+    之后每次同步从最新一页开始，遇到已存档的记录即停止，通常只需一次请求；
+    因 pageLimit 或请求失败中断时，记下中断处的分页位置，之后的同步会从那里继续补全更早的记录
+    """
+
+    def __init__(self, path, api=None):
+        """
+        初始化
+
+        :param path: 数据库文件路径
+        :param api: 用于同步的 WebAPI，默认None，即只离线查询
+        """
+        self.api = api
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS darkroom (
+                    uid INTEGER, time TEXT, timestamp INTEGER, name TEXT, action TEXT, expiration TEXT, reason TEXT,
+                    sync_time INTEGER, PRIMARY KEY (uid, time)
+                );
+                CREATE INDEX IF NOT EXISTS darkroom_timestamp ON darkroom (timestamp);
+                CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT);
+            """)
+
+    def close(self):
+        self.db.close()
+
+    def pending(self):
+        """
+        :return:
+            list: 尚未补全的分页位置（上次同步中断处），为空表示已存档的历史是连续的
+        """
+        row = self.db.execute("SELECT value FROM sync_state WHERE name = 'pending'").fetchone()
+        return json.loads(row[0]) if row else []
+
+    def sync(self, pageLimit=0):
+        """
+        同步小黑屋记录到存档：先获取最新的记录，再从之前中断的位置继续补全
+
+        :param pageLimit: 本次最多获取的页数，默认0，即不限制
+        :return:
+            list: 新增的记录，格式同 WebAPI.get_darkroom
+        """
+        new_entries = []
+        frontiers = [0] + self.pending()
+        pending = []
+        page = 0
+        for i, cursor in enumerate(frontiers):
+            while True:
+                if pageLimit and page >= pageLimit:  # 本次页数用完，剩余部分下次继续
+                    pending.append(cursor)
+                    break
+                try:
+                    result = self.api.get_darkroom_page(cursor)
+                except Exception as e:
+                    print(e)
+                    result = None
+                if result is None:
+                    if cursor:  # 最新一页失败时下次从头开始即可
+                        pending.append(cursor)
+                    break
+                page += 1
+                entries = result['entries']
+                seen = self._seen([(entry['uid'], entry['time']) for entry in entries])
+                fresh = [entry for entry in entries if (entry['uid'], entry['time']) not in seen]
+                with self.db:
+                    self.db.executemany(
+                        'INSERT OR IGNORE INTO darkroom (name, uid, action, expiration, time, reason, timestamp, '
+                        'sync_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        [(*(entry[key] for key in DARKROOM_FIELDS), parse_forum_time(entry['time']),
+                          int(time.time())) for entry in fresh]
+                    )
+                new_entries.extend(fresh)
+                if seen or not result['cursor']:  # 接上了已存档的记录，或已到最早的记录
+                    break
+                cursor = result['cursor']
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('pending', ?)",
+                            (json.dumps(pending),))
+        return new_entries
+
+    def _seen(self, keys):
+        """
+        :return:
+            set: keys 中已存档的 (uid, 操作时间)
+        """
+        seen = set()
+        for uid, entry_time in keys:
+            if self.db.execute('SELECT 1 FROM darkroom WHERE uid = ? AND time = ?', (uid, entry_time)).fetchone():
+                seen.add((uid, entry_time))
+        return seen
+
+    def get_entries(self, uid=None):
+        """
+        获取存档中的小黑屋记录
+
+        :param uid: 只查询此用户，默认None，即所有用户
+        :return:
+            list: 记录列表，按操作时间从新到旧，格式同 WebAPI.get_darkroom，另有 timestamp（操作时间戳）
+        """
+        sql = f'SELECT {", ".join(DARKROOM_FIELDS)}, timestamp FROM darkroom'
+        params = []
+        if uid is not None:
+            sql += ' WHERE uid = ?'
+            params.append(uid)
+        rows = self.db.execute(sql + ' ORDER BY timestamp DESC', params)
+        return [dict(row) for row in rows]
@@ -0,0 +1,111 @@
+import time
+import zlib
+
+
+class HomepageFeed:
+    """
+    主页前10帖变化推送
+
+    保存每个区块上一次的帖子列表，轮询时只下载主页并截取各区块的html，
+    区块html的校验值没有变化时不解析；有变化时只解析该区块，并与上一次比较生成事件
+    """
+
+    def __init__(self, api, blocks=None):
+        """
+        初始化
+
+        :param api: WebAPI
+        :param blocks: 关注的区块名，同 WebAPI.get_top_10_post，如 ('new_post', 'new_reply', 'hot')，默认None，即全部
+        """
+        self.api = api
+        self.blocks = blocks
+        self.hashes = {}  # 区块名: 上一次的html校验值
+        self.snapshots = {}  # 区块名: 上一次的帖子列表
+
+    def poll(self):
+        """
+        获取一次主页，返回与上一次相比的变化；第一次调用只记录当前状态，不返回事件
+
+        :return:
+            list: 事件列表
+                - dict: 单个事件
+                    - block (str): 区块名
+                    - type (str): add 新出现/remove 消失/reorder 相对顺序变化
+                    - tid (int): 帖子tid
+                    - title (str): 帖子标题
+                    - position (int): 当前位置（从0开始），remove 时为原位置
+                    - old_position (int): 原位置，add 时为 None
+            获取失败时返回 None
+        """
+        try:
+            blocks = self.api.get_top_10_blocks()
+        except Exception as e:
+            print(e)
+            return None
+        events = []
+        for key, html in blocks.items():
+            if html is None or (self.blocks is not None and key not in self.blocks):
+                continue
+            digest = zlib.crc32(html.encode())
+            if self.hashes.get(key) == digest:
+                continue
+            posts = self.api.parse_top_10_block(html)
+            if key in self.snapshots:
+                events.extend(self._diff(key, self.snapshots[key], posts))
+            self.hashes[key] = digest
+            self.snapshots[key] = posts
+        return events
+
+    @staticmethod
+    def _diff(block, old, new):
+        old_positions = {post['tid']: i for i, post in enumerate(old)}
+        new_positions = {post['tid']: i for i, post in enumerate(new)}
+        events = []
+        for i, post in enumerate(new):
+            if post['tid'] not in old_positions:
+                events.append({'block': block, 'type': 'add', 'tid': post['tid'], 'title': post['title'],
+                               'position': i, 'old_position': None})
+        for i, post in enumerate(old):
+            if post['tid'] not in new_positions:
+                events.append({'block': block, 'type': 'remove', 'tid': post['tid'], 'title': post['title'],
+                               'position': i, 'old_position': i})
+        # 只比较两次都在的帖子之间的相对顺序，新帖插入导致的整体下移不算 reorder；
+        # 保持相对顺序的最多帖子即新顺序中原位置的最长递增子序列，不在其中的帖子才算移动了
+        common = [post for post in new if post['tid'] in old_positions]
+        kept = HomepageFeed._longest_increasing([old_positions[post['tid']] for post in common])
+        for i, post in enumerate(common):
+            if i not in kept:
+                events.append({'block': block, 'type': 'reorder', 'tid': post['tid'], 'title': post['title'],
+                               'position': new_positions[post['tid']], 'old_position': old_positions[post['tid']]})
+        return events
+
+    @staticmethod
+    def _longest_increasing(values):
+        """
+        :return:
+            set: values 的一个最长递增子序列的下标
+        """
+        lengths = []  # 以 values[i] 结尾的最长递增子序列长度
+        previous = []  # 该子序列中前一项的下标
+        for i, value in enumerate(values):
+            best = max((j for j in range(i) if values[j] < value), key=lambda j: lengths[j], default=None)
+            lengths.append(lengths[best] + 1 if best is not None else 1)
+            previous.append(best)
+        kept = set()
+        i = max(range(len(values)), key=lambda j: lengths[j], default=None)
+        while i is not None:
+            kept.add(i)
+            i = previous[i]
+        return kept
+
+    def run_forever(self, callback, interval=30):
+        """
+        持续轮询，有变化时调用 callback
+
+        :param callback: 回调函数，参数为单个事件，格式同 poll
+        :param interval: 轮询间隔，秒，默认30
+        """
+        while True:
+            for event in self.poll() or []:
+                callback(event)
+            time.sleep(interval)
@@ -0,0 +1,124 @@
+import json
+import threading
+
+
+class Metrics:
+    """
+    进程内指标统计（计数器和直方图）
+
+    实例可以直接作为 WebAPI 的 hook 使用：api.hooks.append(metrics)，
+    之后可导出为 Prometheus 文本格式或 json
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # 直方图分桶上限，秒
+
+    def __init__(self, buckets=BUCKETS, prefix='hepan'):
+        """
+        初始化
+
+        :param buckets: 直方图分桶上限，默认 BUCKETS
+        :param prefix: 指标名前缀，默认 hepan
+        """
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.counters = {}  # (指标名, 标签): 值
+        self.histograms = {}  # (指标名, 标签): [各分桶计数..., 总和, 总数]
+        self.lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        """
+        计数器增加
+
+        :param name: 指标名
+        :param labels: 标签，如 (('endpoint', 'rate'),)
+        :param value: 增加值，默认1
+        """
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """
+        直方图记录一个值
+
+        :param name: 指标名
+        :param value: 观测值
+        :param labels: 标签，如 (('endpoint', 'rate'),)
+        """
+        key = (name, tuple(labels))
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def __call__(self, event):
+        """
+        处理 WebAPI 的调用事件
+        """
+        labels = (('endpoint', event['endpoint']),)
+        self.inc('calls_total', labels + (('status', str(event['status'])),))
+        self.inc('requests_total', labels, event['requests'])
+        self.inc('response_bytes_total', labels, event['bytes'])
+        if event['error']:
+            self.inc('errors_total', labels + (('error', event['error']),))
+        self.observe('network_seconds', event['network_time'], labels)
+        self.observe('parse_seconds', event['parse_time'], labels)
+
+    @staticmethod
+    def _labels(labels):
+        return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}' if labels else ''
+
+    def to_prometheus(self):
+        """
+        :return:
+            str: Prometheus 文本格式
+        """
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{self.prefix}_{name}{self._labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(self.buckets + ('+Inf',), histogram[:len(self.buckets)] + [histogram[-1]]):
+                    lines.append(f'{self.prefix}_{name}_bucket{self._labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{self.prefix}_{name}_sum{self._labels(labels)} {histogram[-2]}')
+                lines.append(f'{self.prefix}_{name}_count{self._labels(labels)} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        """
+        :return:
+            str: json 格式，counters 为计数器列表，histograms 为直方图列表
+        """
+        with self.lock:
+            data = {
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), 'buckets': dict(zip(map(str, self.buckets), histogram)),
+                     'sum': histogram[-2], 'count': histogram[-1]}
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+        return json.dumps(data, ensure_ascii=False)
+
+    def summary(self):
+        """
+        按总耗时（网络+解析）从高到低汇总各接口
+
+        :return:
+            list: [(接口, 调用次数, 网络耗时, 解析耗时)]
+        """
+        with self.lock:
+            result = {}
+            for (name, labels), histogram in self.histograms.items():
+                endpoint = dict(labels).get('endpoint')
+                row = result.setdefault(endpoint, [endpoint, histogram[-1], 0.0, 0.0])
+                if name == 'network_seconds':
+                    row[2] = histogram[-2]
+                elif name == 'parse_seconds':
+                    row[3] = histogram[-2]
+        return sorted((tuple(row) for row in result.values()), key=lambda row: row[2] + row[3], reverse=True)
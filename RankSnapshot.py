@@ -0,0 +1,162 @@
+import sqlite3
+import time
+
+KINDS = {  # 排行榜类型: (WebAPI 方法, 条目键字段, 数据字段)
+    'user': ('get_user_rank', 'uid', 'msg'),
+    'thread': ('get_thread_rank', 'tid', 'count'),
+    'pool': ('get_pool_rank', 'tid', 'count'),
+    'forum': ('get_forum_rank', 'forum', 'count'),
+}
+
+
+class RankSnapshotStore:
+    """
+    排行榜快照存档（SQLite）
+
+    定期保存排行榜，快照只追加不修改，与上一次完全相同时不保存；
+    条目按键（用户榜为uid，帖子榜和投票榜为tid，板块榜为板块名）建索引，可比较两次快照、离线查询排名历史
+    """
+
+    def __init__(self, path, api=None):
+        """
+        初始化
+
+        :param path: 数据库文件路径
+        :param api: 用于抓取排行榜的 WebAPI，默认None，即只离线查询
+        """
+        self.api = api
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY, view TEXT, time INTEGER, notice TEXT
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    snapshot_id INTEGER, key TEXT, uid INTEGER, rank INTEGER, msg TEXT
+                );
+                CREATE INDEX IF NOT EXISTS snapshots_view ON snapshots (view, time);
+                CREATE INDEX IF NOT EXISTS entries_snapshot ON entries (snapshot_id);
+                CREATE INDEX IF NOT EXISTS entries_uid ON entries (uid);
+            """)
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def view_name(kind, sub_rank, order=''):
+        """
+        :return:
+            str: 排行榜名称，如 user:credit:all
+        """
+        return f'{kind}:{sub_rank}:{order}'
+
+    def capture(self, kind, sub_rank, order=''):
+        """
+        抓取并保存一次排行榜快照
+
+        :param kind: 排行榜类型 user/thread/pool/forum
+        :param sub_rank: 子排行榜，同 WebAPI.get_*_rank
+        :param order: 排序方式/类别，同 WebAPI.get_*_rank，板块榜忽略此参数
+        :return:
+            int: 快照id，与上一次相同时返回上一次的id，抓取失败时返回 None
+        """
+        method, key_field, msg_field = KINDS[kind]
+        args = (sub_rank, order) if order and kind != 'forum' else (sub_rank,)
+        result = getattr(self.api, method)(*args)
+        if result is None:
+            return None
+        view = self.view_name(kind, sub_rank, order)
+        rows = [(str(entry[key_field]), entry['uid'] if 'uid' in entry else None, entry['rank'],
+                 str(entry[msg_field])) for entry in result['data']]
+        last = self.latest(view)
+        if last is not None and self._entries(last) == {row[0]: (row[2], row[3]) for row in rows}:
+            return last
+        with self.db:
+            snapshot_id = self.db.execute('INSERT INTO snapshots (view, time, notice) VALUES (?, ?, ?)',
+                                          (view, int(time.time()), result['notice'])).lastrowid
+            self.db.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?)',
+                                [(snapshot_id, *row) for row in rows])
+        return snapshot_id
+
+    def run(self, views, interval=60 * 60):
+        """
+        定期抓取排行榜
+
+        :param views: 排行榜列表，每项为 capture 的参数元组，如 [('user', 'credit', 'all'), ('forum', 'today')]
+        :param interval: 抓取间隔，秒，默认1小时（论坛排行榜每小时更新一次）
+        """
+        while True:
+            for view in views:
+                try:
+                    self.capture(*view)
+                except Exception as e:
+                    print(e)
+            time.sleep(interval)
+
+    def latest(self, view):
+        """
+        :param view: 排行榜名称，见 view_name
+        :return:
+            int: 最新快照id，没有时返回 None
+        """
+        row = self.db.execute('SELECT id FROM snapshots WHERE view = ? ORDER BY id DESC LIMIT 1', (view,)).fetchone()
+        return row[0] if row else None
+
+    def snapshots(self, view):
+        """
+        :param view: 排行榜名称，见 view_name
+        :return:
+            list: [(快照id, 时间戳)]，按时间排序
+        """
+        return self.db.execute('SELECT id, time FROM snapshots WHERE view = ? ORDER BY id', (view,)).fetchall()
+
+    def _entries(self, snapshot_id):
+        rows = self.db.execute('SELECT key, rank, msg FROM entries WHERE snapshot_id = ?', (snapshot_id,))
+        return {key: (rank, msg) for key, rank, msg in rows}
+
+    def diff(self, old_id, new_id):
+        """
+        比较两次快照
+
+        :param old_id: 旧快照id
+        :param new_id: 新快照id
+        :return:
+            dict:
+                - entered (list): 新上榜 [(键, 排名)]
+                - left (list): 掉出榜单 [(键, 原排名)]
+                - moved (list): 排名变化 [(键, 原排名, 新排名)]
+                - changed (list): 数据变化 [(键, 原数据, 新数据)]
+        """
+        old = self._entries(old_id)
+        new = self._entries(new_id)
+        result = {'entered': [], 'left': [], 'moved': [], 'changed': []}
+        for key, (rank, msg) in new.items():
+            if key not in old:
+                result['entered'].append((key, rank))
+                continue
+            old_rank, old_msg = old[key]
+            if old_rank != rank:
+                result['moved'].append((key, old_rank, rank))
+            if old_msg != msg:
+                result['changed'].append((key, old_msg, msg))
+        result['left'] = [(key, rank) for key, (rank, _) in old.items() if key not in new]
+        for name in ('entered', 'left', 'moved'):
+            result[name].sort(key=lambda item: item[-1])
+        return result
+
+    def history(self, uid, view=None):
+        """
+        查询某用户在各次快照中的排名
+
+        :param uid: 用户uid
+        :param view: 只查询此排行榜，默认None，即所有排行榜
+        :return:
+            list: [(时间戳, 排行榜名称, 排名, 数据)]，按时间排序
+        """
+        sql = ('SELECT s.time, s.view, e.rank, e.msg FROM entries e JOIN snapshots s ON s.id = e.snapshot_id '
+               'WHERE e.uid = ?')
+        params = [uid]
+        if view is not None:
+            sql += ' AND s.view = ?'
+            params.append(view)
+        return self.db.execute(sql + ' ORDER BY s.time, s.id', params).fetchall()
@@ -0,0 +1,156 @@
+from collections.abc import Mapping
+
+
+class Record(Mapping):
+    """
+    轻量记录类型基类
+
+    使用 __slots__ 保存字段，比 dict 占用更少内存；同时实现了字典的读取接口，
+    record['uid']、record.get('uid')、dict(record) 等写法与原来的 dict 一致
+    :note:
+        json 等只接受 dict 的地方，需先用 dict(record) 转换
+    """
+    __slots__ = ()
+    _fields = ()  # 字段名，顺序同构造参数
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self._fields, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return (name for name in self._fields if hasattr(self, name))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{k}={v!r}" for k, v in self.items())})'
+
+
+class Reply(Record):
+    """
+    单个回复，字段同 WebAPI.get_reply_page
+    """
+    __slots__ = _fields = ('position', 'pid', 'author', 'uid', 'time', 'content')
+
+    def __init__(self, position, pid, author, uid, time, content):
+        self.position = position
+        self.pid = pid
+        self.author = author
+        self.uid = uid
+        self.time = time
+        self.content = content
+
+
+class PartialReply(Reply):
+    """
+    只包含部分字段的回复，用于 get_reply_page 指定 fields 时
+    """
+    __slots__ = ()
+    __init__ = Record.__init__
+
+
+class ThreadInfo(Record):
+    """
+    主题帖信息，字段同 WebAPI.get_thread_info
+    """
+    __slots__ = _fields = ('tid', 'title', 'pid', 'first_paragraph', 'reply_count', 'author', 'uid', 'create_time')
+
+    def __init__(self, tid, title, pid, first_paragraph, reply_count, author, uid, create_time):
+        self.tid = tid
+        self.title = title
+        self.pid = pid
+        self.first_paragraph = first_paragraph
+        self.reply_count = reply_count
+        self.author = author
+        self.uid = uid
+        self.create_time = create_time
+
+
+class DarkroomEntry(Record):
+    """
+    小黑屋记录，字段同 WebAPI.get_darkroom
+    """
+    __slots__ = _fields = ('name', 'uid', 'action', 'expiration', 'time', 'reason')
+
+    def __init__(self, name, uid, action, expiration, time, reason):
+        self.name = name
+        self.uid = uid
+        self.action = action
+        self.expiration = expiration
+        self.time = time
+        self.reason = reason
+
+
+class RankEntry(Record):
+    """
+    用户排行榜单行，字段同 WebAPI.get_user_rank
+    """
+    __slots__ = _fields = ('rank', 'name', 'uid', 'msg')
+
+    def __init__(self, rank, name, uid, msg):
+        self.rank = rank
+        self.name = name
+        self.uid = uid
+        self.msg = msg
+
+
+class ThreadRankEntry(Record):
+    """
+    帖子排行榜单行，字段同 WebAPI.get_thread_rank
+    """
+    __slots__ = _fields = ('rank', 'title', 'tid', 'forum', 'author', 'uid', 'time', 'count')
+
+    def __init__(self, rank, title, tid, forum, author, uid, time, count):
+        self.rank = rank
+        self.title = title
+        self.tid = tid
+        self.forum = forum
+        self.author = author
+        self.uid = uid
+        self.time = time
+        self.count = count
+
+
+class PoolRankEntry(Record):
+    """
+    投票帖排行榜单行，字段同 WebAPI.get_pool_rank
+    """
+    __slots__ = _fields = ('rank', 'author', 'uid', 'title', 'tid', 'count', 'time', 'voters')
+
+    def __init__(self, rank, author, uid, title, tid, count, time, voters):
+        self.rank = rank
+        self.author = author
+        self.uid = uid
+        self.title = title
+        self.tid = tid
+        self.count = count
+        self.time = time
+        self.voters = voters
+
+
+class ForumRankEntry(Record):
+    """
+    板块排行榜单行，字段同 WebAPI.get_forum_rank
+    """
+    __slots__ = _fields = ('rank', 'forum', 'count')
+
+    def __init__(self, rank, forum, count):
+        self.rank = rank
+        self.forum = forum
+        self.count = count
@@ -0,0 +1,123 @@
+import functools
+import heapq
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import WebAPI
+
+
+class SessionPool:
+    """
+    多账户会话池
+
+    在线程池中并发初始化和刷新各账户，所有账户共用一个 Transport；
+    登录状态保存在 session_dir 中，重启后仍有效的账户无需重新登录；
+    定时刷新时各账户随机错开，只有检测到登录失效时才重新登录
+    """
+
+    def __init__(self, accounts, session_dir=None, transport=None, workers=8, interval=120, jitter=0.2):
+        """
+        初始化
+
+        :param accounts: 账户字典 {用户名: 密码}
+        :param session_dir: 保存登录状态的目录，默认None，即不保存
+        :param transport: 共用的 Transport，默认None，即按 workers 创建一个
+        :param workers: 同时处理的账户数，默认8
+        :param interval: 每个账户的刷新间隔，秒，默认120
+        :param jitter: 刷新间隔的随机浮动比例，默认0.2，即 ±20%
+        """
+        self.accounts = accounts
+        self.session_dir = session_dir
+        self.transport = transport or WebAPI.Transport(pool_maxsize=workers)
+        self.interval = interval
+        self.jitter = jitter
+        self.apis = {}
+        self.refreshing = set()  # 正在刷新的用户名
+        self.executor = ThreadPoolExecutor(workers)
+        if session_dir:
+            os.makedirs(session_dir, exist_ok=True)
+
+    def __getitem__(self, username):
+        return self.apis[username]
+
+    def _session_path(self, username):
+        return os.path.join(self.session_dir, f'{username}.json') if self.session_dir else None
+
+    def open(self):
+        """
+        并发初始化所有账户，有保存的登录状态且仍有效时直接使用，否则登录
+
+        :return:
+            dict: {用户名: 是否可用}
+        """
+        return dict(zip(self.accounts, self.executor.map(self._open, self.accounts.items())))
+
+    def _open(self, account):
+        username, password = account
+        api = WebAPI.WebAPI(username, password, autoLogin=False, transport=self.transport)
+        self.apis[username] = api
+        path = self._session_path(username)
+        if path and api.load_session(path):
+            return True
+        return self._login(api)
+
+    def _login(self, api):
+        try:
+            success = api.login()
+        except WebAPI.HepanException as e:
+            print(e)
+            return False
+        if success and (path := self._session_path(api.username)):
+            api.save_session(path)
+        return success
+
+    def refresh(self, username):
+        """
+        刷新单个账户（访问主页并更新 formhash），检测到登录失效时重新登录
+
+        :param username: 用户名
+        :return:
+            bool: 账户是否可用
+        """
+        api = self.apis[username]
+        if not api.update_formhash():  # 网络错误，等下次刷新
+            return False
+        if not api.logged_in:
+            print(f'[{time.asctime()}] 用户 {username} 登录已失效，重新登录')
+            return self._login(api)
+        if path := self._session_path(username):
+            api.save_session(path)
+        return True
+
+    def run_forever(self):
+        """
+        持续刷新所有账户，每个账户约 interval 秒刷新一次，首次刷新时间在一个周期内随机分布
+        上一次刷新还未结束的账户跳过本次刷新；刷新失败或出错时打印日志
+        """
+        now = time.time()
+        schedule = [(now + random.uniform(0, self.interval), username) for username in self.apis]
+        heapq.heapify(schedule)
+        while schedule:
+            due, username = heapq.heappop(schedule)
+            time.sleep(max(0, due - time.time()))
+            if username in self.refreshing:
+                print(f'[{time.asctime()}] 用户 {username} 上一次刷新未结束，跳过')
+            else:
+                self.refreshing.add(username)
+                future = self.executor.submit(self.refresh, username)
+                future.add_done_callback(functools.partial(self._refreshed, username))
+            next_due = due + self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            heapq.heappush(schedule, (next_due, username))
+
+    def _refreshed(self, username, future):
+        self.refreshing.discard(username)
+        try:
+            if not future.result():
+                print(f'[{time.asctime()}] 刷新用户 {username} 失败')
+        except Exception as e:
+            print(f'[{time.asctime()}] 刷新用户 {username} 出错: {e}')
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskEngine:
+    """
+    论坛任务自动化
+
+    一次巡检（sweep）并发获取 new/doing/done 任务列表和所有未完成任务的详情，
+    申请所有可申请的任务并领取已完成任务的奖励；之后只轮询进行中任务的详情页，完成后立即领取
+    """
+
+    def __init__(self, apis, workers=8):
+        """
+        初始化
+
+        :param apis: 已登录的 WebAPI 列表，如 SessionPool.apis.values()
+        :param workers: 同时进行的请求数，默认8
+        """
+        self.apis = list(apis)
+        self.executor = ThreadPoolExecutor(workers)
+        self.doing = {api.username: set() for api in self.apis}  # 用户名: 进行中的任务id
+
+    def sweep(self, api):
+        """
+        巡检单个账户：申请可申请的任务，领取已完成任务的奖励
+
+        :param api: WebAPI
+        :return:
+            dict:
+                - applied (list): 申请的任务 [(任务id, 是否成功, 提示信息)]
+                - finished (list): 领取奖励的任务 [(任务id, 是否成功, 提示信息)]
+                - doing (list): 仍在进行中的任务id
+                - done (list): 已完成的任务列表，格式同 WebAPI.get_task_list
+        """
+        new, doing, done = self._map(api.get_task_list, ('new', 'doing', 'done'))
+        task_ids = [task['id'] for task in (new or []) + (doing or [])]
+        infos = dict(zip(task_ids, self._map(api.get_task_info, task_ids)))
+        applicable = [task_id for task_id, info in infos.items() if info and info['status'] == 'applicable']
+        applied = [(task_id, *(result or (False, '请求失败')))
+                   for task_id, result in zip(applicable, self._map(api.apply_task, applicable))]
+        self.doing[api.username] = {task_id for task_id, info in infos.items() if info and info['status'] == 'doing'}
+        self.doing[api.username].update(task_id for task_id, success, _ in applied if success)
+        result = self.poll(api)
+        result.update({'applied': applied, 'done': done or []})
+        return result
+
+    def poll(self, api):
+        """
+        检查单个账户进行中任务的进度，已完成的领取奖励
+
+        :param api: WebAPI
+        :return:
+            dict:
+                - finished (list): 领取奖励的任务 [(任务id, 是否成功, 提示信息)]
+                - doing (list): 仍在进行中的任务id
+        """
+        task_ids = sorted(self.doing[api.username])
+        infos = self._map(api.get_task_info, task_ids)
+        claimable = [task_id for task_id, info in zip(task_ids, infos) if info and info['claimable']]
+        finished = [(task_id, *(result or (False, '请求失败')))
+                    for task_id, result in zip(claimable, self._map(api.finish_task, claimable))]
+        self.doing[api.username].difference_update(task_id for task_id, success, _ in finished if success)
+        return {'finished': finished, 'doing': sorted(self.doing[api.username])}
+
+    def _map(self, func, args):
+        """
+        并发调用 func，出错的调用结果为 None
+        """
+        def call(arg):
+            try:
+                return func(arg)
+            except Exception as e:
+                print(e)
+                return None
+        return list(self.executor.map(call, args))
+
+    def sweep_all(self):
+        """
+        并发巡检所有账户
+
+        :return:
+            dict: {用户名: sweep 的结果}
+        """
+        with ThreadPoolExecutor(max(1, len(self.apis))) as accounts:
+            return dict(zip((api.username for api in self.apis), accounts.map(self.sweep, self.apis)))
+
+    def poll_all(self):
+        """
+        检查所有账户进行中的任务
+
+        :return:
+            dict: {用户名: poll 的结果}
+        """
+        apis = [api for api in self.apis if self.doing[api.username]]
+        with ThreadPoolExecutor(max(1, len(apis))) as accounts:
+            return dict(zip((api.username for api in apis), accounts.map(self.poll, apis)))
+
+    def run_forever(self, poll_interval=5 * 60, sweep_interval=60 * 60):
+        """
+        持续运行：每 sweep_interval 秒巡检一次所有账户，其间每 poll_interval 秒检查一次进行中的任务
+
+        :param poll_interval: 检查进度的间隔，秒，默认5分钟
+        :param sweep_interval: 巡检的间隔，秒，默认1小时
+        """
+        next_sweep = 0
+        while True:
+            if time.time() >= next_sweep:
+                results = self.sweep_all()
+                next_sweep = time.time() + sweep_interval
+            else:
+                results = self.poll_all()
+            for username, result in results.items():
+                for task_id, success, message in result.get('applied', []) + result['finished']:
+                    print(f'[{time.asctime()}] 用户 {username} 任务 {task_id}: {message}')
+            time.sleep(poll_interval)
+
+    def close(self):
+        self.executor.shutdown()
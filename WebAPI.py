@@ -1,6 +1,68 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import shelve
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from bs4 import BeautifulSoup, SoupStrainer
 from operator import itemgetter
+from Archive import FORUM_TZ
+from Records import Reply, PartialReply, ThreadInfo, DarkroomEntry, RankEntry, ThreadRankEntry, PoolRankEntry, \
+    ForumRankEntry
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+TOP_10_BLOCKS = {  # 主页前10帖区块: 区块id
+    'new_reply': 'portal_block_66_content',  # 最新回复
+    'new_post': 'portal_block_67_content',  # 最新发表
+    'hot': 'portal_block_68_content',  # 今日热门
+    'activity': 'portal_block_97_content',  # 河畔活动
+    'live': 'portal_block_96_content',  # 生活专区
+    'show': 'portal_block_95_content'  # 精华展示
+}
+
+# 各类网页只需要解析的部分
+STRAINERS = {
+    'top_10': SoupStrainer(id=list(TOP_10_BLOCKS.values())),
+    'darkroom': SoupStrainer('table', id='darkroomtable'),
+    'rank': SoupStrainer(id='ct'),
+    'task': SoupStrainer('div', class_='bm bw0'),
+    'message': SoupStrainer('div', id='messagetext'),
+}
+
+FORMHASH_ERRORS = ('表单验证串不符', '来路不正确')  # formhash 失效时服务器的提示
+
+
+def parse_html(text, parse_only=None):
+    """
+    解析网页，安装了 lxml 时使用 lxml，否则使用 html.parser
+
+    :param text: 网页html
+    :param parse_only: SoupStrainer，只解析匹配的部分，默认None，即解析整个网页
+    :return:
+        BeautifulSoup
+    :note:
+        按 parse_only 没有解析到任何内容时（如网页结构变化），会退回解析整个网页
+    """
+    soup = BeautifulSoup(text, HTML_PARSER, parse_only=parse_only)
+    if parse_only is not None and not soup.contents:
+        soup = BeautifulSoup(text, HTML_PARSER)
+    return soup
 
 
 class HepanException(Exception):
@@ -15,25 +77,472 @@ class HepanException(Exception):
         return self.message
 
 
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    论坛连续请求失败，熔断期间不再发送请求时抛出
+
+    属于网络错误而不是 HepanException，各接口按网络错误处理（返回 None/False），之后可以照常重试
+    """
+
+
+class RetryPolicy:
+    """
+    重试与熔断策略
+
+    请求出错或返回 statuses 中的状态码时，按指数退避加随机抖动重试；
+    POST 默认只在请求确定未发出（连接失败）时重试，避免重复评分、点评；
+    连续失败达到 breaker_threshold 次后熔断，breaker_timeout 秒内的请求直接抛出 CircuitOpenError
+    """
+    IDEMPOTENT_POSTS = {'update_authorization', 'edit_post'}  # 重复提交不会产生额外效果的 POST 接口
+
+    def __init__(self, retries=2, backoff=0.5, max_backoff=8, jitter=0.5, statuses=(429, 500, 502, 503, 504),
+                 endpoint_retries=None, breaker_threshold=5, breaker_timeout=30):
+        """
+        初始化
+
+        :param retries: 默认最多重试次数，默认2
+        :param backoff: 第一次重试前的等待时间，秒，之后每次翻倍，默认0.5
+        :param max_backoff: 最长等待时间，秒，默认8
+        :param jitter: 等待时间随机减少的最大比例，默认0.5
+        :param statuses: 需要重试的HTTP状态码
+        :param endpoint_retries: 各接口的最多重试次数，如 {'get_reply_page': 5}，未指定的使用 retries
+        :param breaker_threshold: 连续失败多少次后熔断，默认5，0表示不熔断
+        :param breaker_timeout: 熔断时长，秒，默认30
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = set(statuses)
+        self.endpoint_retries = endpoint_retries or {}
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        """
+        熔断期间抛出 CircuitOpenError
+        """
+        if self.open_until and time.time() < self.open_until:
+            raise CircuitOpenError(f'论坛请求连续失败，暂停请求 {self.open_until - time.time():.0f} 秒')
+
+    def record(self, success):
+        """
+        记录一次请求结果
+        """
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.open_until = 0
+                return
+            self.failures += 1
+            if self.breaker_threshold and self.failures >= self.breaker_threshold:
+                self.open_until = time.time() + self.breaker_timeout
+
+    def should_retry(self, method, endpoint, attempt, error=None):
+        """
+        :param method: 请求方法
+        :param endpoint: 接口名
+        :param attempt: 已重试次数
+        :param error: 请求异常，返回了错误状态码时为None
+        :return:
+            bool: 是否重试
+        """
+        if attempt >= self.endpoint_retries.get(endpoint, self.retries):
+            return False
+        if method == 'GET' or endpoint in self.IDEMPOTENT_POSTS:
+            return True
+        return error is not None and self._not_sent(error)
+
+    @staticmethod
+    def _not_sent(error):
+        """
+        请求是否确定没有发送到服务器
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def wait(self, attempt):
+        """
+        第 attempt 次重试前等待
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        time.sleep(delay * (1 - random.uniform(0, self.jitter)))
+
+
+class RateLimiter:
+    """
+    令牌桶限速
+
+    请求分为三类分别限速：api（/star/api/ 下的json接口）、html（网页）、write（POST 提交，如评分、点评）；
+    指定 path 时令牌桶保存在 SQLite 文件中，使用同一文件的多个进程共同受限
+    """
+    DEFAULT_RATES = {  # 类别: (每秒产生令牌数, 桶容量)
+        'api': (5, 10),
+        'html': (2, 5),
+        'write': (0.5, 2),
+    }
+
+    def __init__(self, rates=None, path=None):
+        """
+        初始化
+
+        :param rates: 各类别的 (每秒令牌数, 桶容量)，如 {'html': (1, 3)}，未指定的使用 DEFAULT_RATES
+        :param path: 跨进程共享的 SQLite 文件路径，默认None，即只在本进程内共享
+        """
+        self.rates = {**self.DEFAULT_RATES, **(rates or {})}
+        self.lock = threading.Lock()
+        self.buckets = {}  # 类别: [令牌数, 更新时间]
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS buckets (kind TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    @staticmethod
+    def classify(method, url):
+        """
+        :return:
+            str: 请求类别 api/html/write
+        """
+        if method == 'POST':
+            return 'write'
+        return 'api' if '/star/api/' in url else 'html'
+
+    def acquire(self, kind):
+        """
+        取一个令牌，没有令牌时等待
+
+        :param kind: 请求类别
+        """
+        while (wait := self._take(kind)) > 0:
+            time.sleep(wait)
+
+    def _take(self, kind):
+        """
+        :return:
+            float: 取到令牌时为0，否则为需要等待的秒数
+        """
+        capacity = self.rates[kind][1]
+        with self.lock:
+            now = time.time()
+            if self.db is None:
+                tokens, wait = self._refill(kind, *self.buckets.get(kind, (capacity, now)), now)
+                self.buckets[kind] = (tokens, now)
+                return wait
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT tokens, updated FROM buckets WHERE kind = ?', (kind,)).fetchone()
+                tokens, wait = self._refill(kind, *(row or (capacity, now)), now)
+                self.db.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (kind, tokens, now))
+                self.db.execute('COMMIT')
+            except Exception:
+                if self.db.in_transaction:  # 出错时回滚，否则共用的连接之后无法再开始事务
+                    self.db.execute('ROLLBACK')
+                raise
+            return wait
+
+    def _refill(self, kind, tokens, updated, now):
+        """
+        :return:
+            tuple: (取令牌后的令牌数, 需要等待的秒数)，取到令牌时等待0秒
+        """
+        rate, capacity = self.rates[kind]
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            return tokens - 1, 0
+        return tokens, (1 - tokens) / rate
+
+
+class Transport:
+    """
+    HTTP传输层
+
+    多个 WebAPI 实例可以共用同一个 Transport，共享到河畔的长连接、重试与熔断状态，cookie 和 authorization 仍各自独立
+    """
+
+    def __init__(self, pool_connections=1, pool_maxsize=10, pool_block=False, timeout=10, retry=None, limiter=None):
+        """
+        初始化
+
+        :param pool_connections: 缓存的连接池个数（每个主机一个），默认1
+        :param pool_maxsize: 每个连接池保持的最大连接数，默认10
+        :param pool_block: 连接池用尽时是否等待空闲连接，默认False，即临时新建连接
+        :param timeout: 默认请求超时，秒，也可以是 (连接超时, 读取超时)，默认10
+        :param retry: RetryPolicy，默认None，即使用默认参数；RetryPolicy(retries=0, breaker_threshold=0) 可关闭重试和熔断
+        :param limiter: RateLimiter，默认None，即不限速
+        :note:
+            requests 不支持 HTTP/2，连接均为 HTTP/1.1 keep-alive
+        """
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.limiter = limiter
+
+    def mount(self, session):
+        """
+        让 session 使用此传输层的连接池
+
+        :param session: requests.Session
+        """
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+
+
+class ResponseCache:
+    """
+    只读接口的结果缓存
+
+    内存中按最近使用淘汰，可选保存到磁盘；过期后若服务器提供了 ETag/Last-Modified，会发送条件请求，
+    未修改时直接沿用缓存结果，不再解析网页
+    :note:
+        缓存命中时返回的是同一个对象，请勿修改
+    """
+    DEFAULT_TTL = {  # 接口: 缓存有效期，秒
+        'get_top_10_post': 60,
+        'get_darkroom': 5 * 60,
+        'get_user_rank': 10 * 60,
+        'get_thread_rank': 10 * 60,
+        'get_pool_rank': 10 * 60,
+        'get_forum_rank': 10 * 60,
+        'get_task_list': 60,
+    }
+
+    def __init__(self, maxsize=256, ttl=None, path=None):
+        """
+        初始化
+
+        :param maxsize: 内存中最多缓存的结果数，默认256
+        :param ttl: 各接口的缓存有效期，如 {'get_top_10_post': 30}，未指定的使用 DEFAULT_TTL
+        :param path: 磁盘缓存文件路径（shelve），默认None，即只缓存在内存中
+        """
+        self.maxsize = maxsize
+        self.ttl = {**self.DEFAULT_TTL, **(ttl or {})}
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.shelf = shelve.open(path) if path else None
+
+    def get(self, key):
+        """
+        :param key: 缓存键
+        :return:
+            dict: 缓存项 {'time', 'validators', 'result'}，不存在时返回 None
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            if self.shelf is not None and key in self.shelf:
+                entry = self.shelf[key]
+                self._put(key, entry)
+                return entry
+        return None
+
+    def set(self, key, entry):
+        """
+        :param key: 缓存键
+        :param entry: 缓存项 {'time', 'validators', 'result'}
+        """
+        with self.lock:
+            self._put(key, entry)
+            if self.shelf is not None:
+                self.shelf[key] = entry
+                self.shelf.sync()
+
+    def _put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.shelf is not None:
+                self.shelf.clear()
+
+
+class _NotModified(Exception):
+    """
+    条件请求返回 304 时在 _request 中抛出，由 _cached 捕获
+    """
+
+
+def _cached(func):
+    """
+    只读接口的缓存装饰器，WebAPI.cache 为 None 时不缓存
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return func(self, *args, **kwargs)
+        key = repr((self.username, func.__name__, args, sorted(kwargs.items())))
+        entry = self.cache.get(key)
+        if entry and time.time() - entry['time'] < self.cache.ttl.get(func.__name__, 0):
+            return entry['result']
+        self._local.conditional = entry['validators'] if entry else {}
+        self._local.validators = {}
+        try:
+            result = func(self, *args, **kwargs)
+        except _NotModified:
+            result = entry['result']
+        finally:
+            self._local.conditional = None
+        self.cache.set(key, {'time': time.time(), 'validators': self._local.validators, 'result': result})
+        return result
+
+    return wrapper
+
+
+def _instrumented(func):
+    """
+    接口调用统计装饰器，WebAPI.hooks 不为空时，每次调用结束后将事件传给每个 hook
+    hook 抛出的异常只打印，不影响接口的返回值或异常
+
+    事件 dict：
+        - endpoint (str): 接口名，即方法名
+        - status (int): 最后一个请求的 HTTP 状态码，没有请求时为 None
+        - requests (int): 请求次数
+        - bytes (int): 响应总字节数
+        - network_time (float): 网络耗时，秒
+        - parse_time (float): 除网络和内部调用其他接口以外的耗时（解析json/网页等），秒
+        - error (str): 异常类型名，没有异常时为 None
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        event = {'endpoint': func.__name__, 'status': None, 'requests': 0, 'bytes': 0, 'network_time': 0.0,
+                 'parse_time': 0.0, 'error': None}
+        stack = self._local.__dict__.setdefault('events', [])
+        frame = [event, 0.0]  # 事件, 内部调用其他接口的耗时
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        except Exception as e:
+            event['error'] = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            event['parse_time'] = max(0.0, elapsed - event['network_time'] - frame[1])
+            for hook in self.hooks:
+                try:
+                    hook(event)
+                except Exception as e:
+                    print(e)
+
+    return wrapper
+
+
 class WebAPI:
     """
     河畔网页API
     """
     formhash = ''
+    formhash_time = 0  # formhash 获取时间戳，0表示已失效
+    formhash_ttl = 60 * 60  # formhash 有效期，秒
+    logged_in = None  # 最近一次获取网页时是否处于登录状态，未知时为None
+    _formhash_pattern = re.compile(r'formhash(?:=|" value=")(\w{8})')
+    records = False  # 为True时，回复、帖子信息、小黑屋、排行榜返回 Records 中的记录类型（更省内存），而不是dict
+    _reply_key_map = {  # 接口字段: 回复字段
+        'position': 'position',
+        'post_id': 'pid',
+        'author': 'author',
+        'author_id': 'uid',
+        'dateline': 'time',
+        'message': 'content'
+    }
 
-    def __init__(self, username, password, autoLogin=True):
+    def __init__(self, username, password, autoLogin=True, transport=None, cache=None, session_file=None):
         """
         初始化
         :param username: 用户名
         :param password: 密码
         :param autoLogin: 是否在初始化后自动登录，默认True
+        :param transport: 共用的 Transport，默认None，即单独创建一个
+        :param cache: 只读接口使用的 ResponseCache，默认None，即不缓存
+        :param session_file: 登录状态文件，默认None；文件中的登录状态有效时不再登录，登录后会保存到此文件
         """
         self.username = username
         self.password = password
+        self.transport = transport or Transport()
+        self.cache = cache
+        self.hooks = []  # 接口调用事件回调，见 _instrumented，如 Metrics.Metrics()
+        self._local = threading.local()
+        self._inflight = {}  # 正在进行的合并请求，见 _coalesce
+        self._inflight_lock = threading.Lock()
+        self._post_meta = {}  # (tid, pid): 编辑所需的帖子元数据，见 get_post_meta
+        self._last_edit = {}  # (tid, pid): 上一次成功提交的 (标题, 内容)
         self.session = requests.Session()
-        if autoLogin:
-            self.login()
+        self.transport.mount(self.session)
+        if session_file and self.load_session(session_file):
+            return
+        if autoLogin and self.login() and session_file:
+            self.save_session(session_file)
+
+    def _request(self, method, url, timeout=None, **kwargs):
+        """
+        发送请求，所有接口都通过此方法访问网络
+
+        :param method: 请求方法，GET/POST
+        :param url: 请求地址
+        :param timeout: 本次请求超时，默认None，即使用 Transport 的默认超时
+        :return:
+            requests.Response
+        """
+        conditional = getattr(self._local, 'conditional', None)
+        if conditional and method == 'GET':  # 缓存过期后的条件请求
+            kwargs['headers'] = {**conditional, **kwargs.get('headers', {})}
+        events = self._local.__dict__.get('events')
+        event = events[-1][0] if events else {'endpoint': None, 'network_time': 0.0, 'requests': 0, 'bytes': 0}
+        policy = self.transport.retry
+        limiter = self.transport.limiter
+        attempt = 0
+        while True:
+            policy.check()
+            if limiter:
+                limiter.acquire(limiter.classify(method, url))
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, url, timeout=timeout or self.transport.timeout, **kwargs)
+            except requests.RequestException as e:
+                event['network_time'] += time.perf_counter() - start
+                policy.record(False)
+                if not policy.should_retry(method, event['endpoint'], attempt, e):
+                    raise
+            else:
+                event['network_time'] += time.perf_counter() - start
+                event['status'] = r.status_code
+                event['requests'] += 1
+                event['bytes'] += len(r.content)
+                failed = r.status_code in policy.statuses
+                policy.record(not failed)
+                if not failed or not policy.should_retry(method, event['endpoint'], attempt):
+                    break
+            policy.wait(attempt)
+            attempt += 1
+        if conditional is not None:
+            if r.status_code == 304:
+                raise _NotModified()
+            self._local.validators = {header: r.headers[name] for name, header in
+                                      (('ETag', 'If-None-Match'), ('Last-Modified', 'If-Modified-Since'))
+                                      if name in r.headers}
+        if 'text/html' in r.headers.get('Content-Type', ''):  # 顺便从网页中获取 formhash 和登录状态
+            if match := self._formhash_pattern.search(r.text):
+                self.formhash = match.group(1)
+                self.formhash_time = time.time()
+                self.logged_in = 'action=logout' in r.text
+        return r
 
+    @_instrumented
     def login(self):
         """
         登录并自动更新 authorization
@@ -47,9 +556,11 @@ class WebAPI:
         url = 'https://bbs.uestc.edu.cn/member.php?mod=logging&action=login&loginsubmit=yes&inajax=1'
         data = {'loginfield': 'username', 'username': self.username, 'password': self.password}
         try:
-            r = self.session.post(url, data=data, timeout=10)
+            r = self._request('POST', url, data=data)
             r.raise_for_status()
             if '欢迎您回来' in r.text:
+                self.invalidate_formhash()  # 登录前后 formhash 不同
+                self.logged_in = True
                 return True and self.update_authorization()
             else:
                 raise HepanException(f'登录失败 username={self.username}, password={self.password}\n{r.text}')
@@ -60,6 +571,62 @@ class WebAPI:
                 print(e)
                 return False
 
+    def save_session(self, path):
+        """
+        保存登录状态（cookie、authorization、formhash）到文件
+
+        :param path: json文件路径
+        """
+        session = {
+            'cookies': [
+                {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path, 'expires': c.expires,
+                 'secure': c.secure}
+                for c in self.session.cookies
+            ],
+            'authorization': self.session.headers.get('Authorization'),
+            'formhash': self.formhash,
+            'formhash_time': self.formhash_time,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(session, f)
+
+    def load_session(self, path, check=True):
+        """
+        从 save_session 保存的文件恢复登录状态
+
+        :param path: json文件路径
+        :param check: 是否访问一次主页确认登录状态仍然有效（同时更新 formhash），默认True
+        :return:
+            bool: 成功恢复且登录有效 True，文件不存在或登录已失效 False
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding='utf-8') as f:
+            session = json.load(f)
+        for cookie in session['cookies']:
+            self.session.cookies.set(**cookie)
+        if session['authorization']:
+            self.session.headers.update({'Authorization': session['authorization']})
+        self.formhash = session['formhash']
+        self.formhash_time = session['formhash_time']
+        if not check:
+            return True
+        return self.check_session()
+
+    def check_session(self):
+        """
+        访问主页检查登录状态，同时更新 formhash，authorization 缺失时补充获取
+
+        :return:
+            bool: 已登录 True，未登录或网络错误 False
+        """
+        if not self.update_formhash() or not self.logged_in:
+            return False
+        if 'Authorization' not in self.session.headers:
+            return self.update_authorization()
+        return True
+
+    @_instrumented
     def update_formhash(self):
         """
         更新 formhash
@@ -68,16 +635,37 @@ class WebAPI:
             成功 True，失败 False
         """
         url = 'https://bbs.uestc.edu.cn'
+        self.invalidate_formhash()
         try:
-            r = self.session.get(url)
+            r = self._request('GET', url)
             r.raise_for_status()
-            soup = BeautifulSoup(r.text, 'html.parser')
-            self.formhash = soup.find('input', {'name': 'formhash'})['value']
+            if not self.formhash_time:
+                raise HepanException('主页中未找到 formhash')
             return True
         except Exception as e:
             print(e)
             return False
 
+    def ensure_formhash(self):
+        """
+        formhash 不存在或已过期时更新 formhash
+
+        :return:
+            bool: 本次是否重新获取了 formhash
+        :note:
+            任何网页请求都会顺便更新 formhash，因此通常不需要额外请求
+        """
+        if self.formhash_time and time.time() - self.formhash_time < self.formhash_ttl:
+            return False
+        return self.update_formhash()
+
+    def invalidate_formhash(self):
+        """
+        将 formhash 标记为失效，下次操作前会重新获取
+        """
+        self.formhash_time = 0
+
+    @_instrumented
     def update_authorization(self):
         """
         更新 authorization
@@ -88,7 +676,7 @@ class WebAPI:
         url = 'https://bbs.uestc.edu.cn/star/api/v1/auth/adoptLegacyAuth'
         headers = {'X-Uestc-Bbs': '1'}
         try:
-            r = self.session.post(url, headers=headers)
+            r = self._request('POST', url, headers=headers)
             r.raise_for_status()
             authorization = r.json()['data']['authorization']
             self.session.headers.update({"Authorization": authorization})
@@ -97,6 +685,7 @@ class WebAPI:
             print(e)
             return False
 
+    @_instrumented
     def rate(self, tid, pid, score, reason='', update_formhash=True):
         """
         对帖子或回复评分（加/扣水）
@@ -105,28 +694,31 @@ class WebAPI:
         :param pid: 帖子或回复pid
         :param score: 水滴数，负数表示扣水
         :param reason: 操作理由（默认空）
-        :param update_formhash: 是否先更新formhash，默认True
+        :param update_formhash: formhash 过期时是否先更新，因 formhash 失效被拒绝时是否更新 formhash 后重试一次，默认True
         :return:
             bool: 成功 True，失败 False
         :raise:
             HepanException: pid与tid不匹配/formhash过期，或帖子不存在/被删除/无权访问
         """
-        if update_formhash:  # 短时间大量评分时，建议手动更新formhash一次即可，不需要每次都更新
-            self.update_formhash()
+        fresh = update_formhash and self.ensure_formhash()
         url = 'https://bbs.uestc.edu.cn/forum.php?mod=misc&action=rate&ratesubmit=yes&inajax=1'
-        data = {
-            'formhash': self.formhash,
-            'tid': tid,
-            'pid': pid,
-            'score2': score,
-            'reason': reason
-        }
         try:
-            r = self.session.post(url, data=data)
-            r.raise_for_status()
-            if '感谢您的参与' in r.text:
-                return True
-            else:
+            while True:
+                data = {
+                    'formhash': self.formhash,
+                    'tid': tid,
+                    'pid': pid,
+                    'score2': score,
+                    'reason': reason
+                }
+                r = self._request('POST', url, data=data)
+                r.raise_for_status()
+                if '感谢您的参与' in r.text:
+                    return True
+                if update_formhash and not fresh and any(error in r.text for error in FORMHASH_ERRORS) \
+                        and self.update_formhash():  # 缓存的 formhash 已失效，更新后重试一次
+                    fresh = True
+                    continue
                 raise HepanException(f'评价失败 tid={tid}, pid={pid}, score={score}, reason={reason}\n{r.text}')
         except Exception as e:
             if isinstance(e, HepanException):
@@ -135,6 +727,21 @@ class WebAPI:
                 print(e)
                 return False
 
+    def rate_many(self, items, **kwargs):
+        """
+        批量评分，单个失败不会中断后续评分
+
+        :param items: 评分任务列表，每项为 (tid, pid, score, reason) 或 (tid, pid, score, reason, uid)
+        :param kwargs: 传给 RatingQueue 的参数，如 daily_limit, user_limit, interval, state_file
+        :return:
+            list: 每项的结果，格式见 RatingQueue.run
+        """
+        queue = RatingQueue(self, **kwargs)
+        for item in items:
+            queue.add(*item)
+        return queue.run()
+
+    @_instrumented
     def comment(self, tid, pid, content, update_formhash=True):
         """
         点评帖子
@@ -142,22 +749,93 @@ class WebAPI:
         :param tid: 帖子tid
         :param pid: 帖子pid
         :param content: 点评内容
-        :param update_formhash: 是否先更新formhash，默认True
+        :param update_formhash: formhash 过期时是否先更新，因 formhash 失效被拒绝时是否更新 formhash 后重试一次，默认True
+        :return:
+            bool: 成功 True，网络错误 False
+        :raise:
+            HepanException: 服务器拒绝点评（如内容过短、无权点评、formhash过期），异常信息为服务器的提示
+        """
+        url = (f'https://bbs.uestc.edu.cn/forum.php?mod=post&action=reply&comment=yes&tid={tid}&pid={pid}'
+               '&commentsubmit=yes&inajax=1')
+        fresh = update_formhash and self.ensure_formhash()
+        try:
+            while True:
+                data = {
+                    'formhash': self.formhash,
+                    'handlekey': 'comment',
+                    'message': content,
+                }
+                r = self._request('POST', url, data=data)
+                r.raise_for_status()
+                success, message = self._ajax_message(r.text, 'comment')
+                if success:
+                    return True
+                if update_formhash and not fresh and any(error in message for error in FORMHASH_ERRORS) \
+                        and self.update_formhash():  # 缓存的 formhash 已失效，更新后重试一次
+                    fresh = True
+                    continue
+                raise HepanException(f'点评失败 tid={tid}, pid={pid}: {message}')
+        except Exception as e:
+            if isinstance(e, HepanException):
+                raise
+            else:
+                print(e)
+                return False
+
+    @staticmethod
+    def _ajax_message(text, handlekey):
+        """
+        解析 inajax=1 请求返回的提示
+
+        :return:
+            tuple: (是否成功, 提示信息)
+        """
+        if f'succeedhandle_{handlekey}' in text:
+            return True, ''
+        match = re.search(rf"errorhandle_{handlekey}\('(.*?)'", text, re.S)
+        if match:
+            return False, match.group(1)
+        return False, re.sub(r'<!\[CDATA\[|\]\]>|<[^>]+>', '', text).strip()
+
+    def comment_many(self, jobs, workers=4, interval=1):
+        """
+        批量点评，单个失败不会中断后续点评
 
+        :param jobs: 点评任务列表，每项为 (tid, pid, content)
+        :param workers: 同时提交的点评数，默认4
+        :param interval: 相邻两次提交的最短间隔，秒，默认1
+        :return:
+            list: 每项的结果，顺序与 jobs 相同
+                - dict: 单个点评结果
+                    - tid, pid, content: 同 jobs
+                    - status (str): success/failed
+                    - message (str): 失败的原因
         :note:
-            由于服务器返回更新后整个网页html，无法直接得知是否成功，因此没有返回值
+            formhash 使用缓存，不会每次点评都刷新；失败的任务可以筛选 status 为 failed 的项重新提交
         """
-        url = f'https://bbs.uestc.edu.cn/forum.php?mod=post&action=reply&comment=yes&tid={tid}&pid={pid}&commentsubmit=yes'
-        if update_formhash:  # 短时间大量点评时，建议手动更新formhash一次即可，不需要每次都更新
-            self.update_formhash()
-        data = {
-            'formhash': self.formhash,
-            'handlekey': 'comment',
-            'message': content,
-        }
-        r = self.session.post(url, data=data)
-        r.raise_for_status()
+        self.ensure_formhash()
+        lock = threading.Lock()
+        last_submit = [0.0]
+
+        def submit(job):
+            tid, pid, content = job
+            with lock:  # 按 interval 错开提交
+                wait = last_submit[0] + interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                last_submit[0] = time.time()
+            result = {'tid': tid, 'pid': pid, 'content': content}
+            try:
+                if self.comment(tid, pid, content):
+                    return {**result, 'status': 'success', 'message': ''}
+                return {**result, 'status': 'failed', 'message': '网络错误'}
+            except HepanException as e:
+                return {**result, 'status': 'failed', 'message': e.message}
 
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(submit, jobs))
+
+    @_instrumented
     def get_thread_info(self, tid):
         """
         获取指定主题帖信息
@@ -176,26 +854,8 @@ class WebAPI:
         :raise:
             HepanException: 帖子不存在/被删除，或无权访问
         """
-        url = f'https://bbs.uestc.edu.cn/star/api/v1/post/list?thread_id={tid}&page=1&thread_details=1'
         try:
-            r = self.session.get(url)
-            r.raise_for_status()
-            data = r.json()
-            if data['code'] != 0:
-                raise HepanException(f'{data["message"]} tid={tid}')
-            data = data['data']
-            thread = data['rows'][0]
-            thread_info = {
-                'tid': tid,
-                'title': thread['subject'],
-                'pid': thread['post_id'],
-                'first_paragraph': thread['message'].split('\n')[0].strip(),
-                'reply_count': data['total'] - 1,
-                'author': thread['author'],
-                'uid': thread['author_id'],
-                'create_time': thread['dateline']
-            }
-            return thread_info
+            return self._parse_thread_info(tid, self._post_list(tid, 1))
         except Exception as e:
             if isinstance(e, HepanException):
                 raise
@@ -203,16 +863,20 @@ class WebAPI:
                 print(e)
                 return None
 
-    def get_reply_page(self, tid, page=1):
+    @_instrumented
+    def get_reply_page(self, tid, page=1, fields=None):
         """
         获取一页回复
 
         :param tid: 帖子tid
         :param page: 要获取第几页，默认1
+        :param fields: 回复中需要的字段，如 ('position', 'uid')，默认None，即全部字段
 
         :return:
             dict:
                 - hasNext (bool): 是否还有下一页
+                - total (int): 帖子总楼层数（含主帖）
+                - page_size (int): 每页楼层数
                 - replies (list): 回复列表
                     - dict: 单个回复详细信息
                         - position (int): 楼层
@@ -223,37 +887,13 @@ class WebAPI:
                         - content (str): 回复具体内容
         :raise:
             HepanException: 帖子不存在/被删除，或无权访问
+            ValueError: fields 为空或包含未知字段
         :note:
             第一页第一个实际上为主帖
         """
-        url = f'https://bbs.uestc.edu.cn/star/api/v1/post/list?thread_id={tid}&page={page}&thread_details=1'
+        self._check_fields(fields)
         try:
-            r = self.session.get(url)
-            r.raise_for_status()
-            data = r.json()
-            if data['code'] != 0:
-                raise HepanException(f'{data["message"]} tid={tid}')
-            data = data['data']
-            hasNext = data['total'] > data['page'] * data['page_size']
-            rows = data['rows']
-            key_map = {
-                'position': 'position',
-                'post_id': 'pid',
-                'author': 'author',
-                'author_id': 'uid',
-                'dateline': 'time',
-                'message': 'content'
-            }
-            source_keys = list(key_map.keys())
-            getter = itemgetter(*source_keys)
-            replies = [
-                {
-                    key_map[key]: value.strip() if key == 'message' else value
-                    for key, value in zip(source_keys, getter(row))
-                }
-                for row in rows
-            ]
-            return {'hasNext': hasNext, 'replies': replies}
+            return self._parse_reply_page(self._post_list(tid, page), fields)
         except Exception as e:
             if isinstance(e, HepanException):
                 raise
@@ -261,6 +901,142 @@ class WebAPI:
                 print(e)
                 return None
 
+    @_instrumented
+    def get_thread(self, tid, fields=None):
+        """
+        用一次请求同时获取主题帖信息和第一页回复
+
+        :param tid: 帖子tid
+        :param fields: 回复中需要的字段，同 get_reply_page
+        :return:
+            dict: 同 get_reply_page，另有
+                - info (dict): 帖子信息，同 get_thread_info
+            失败时返回 None
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+            ValueError: fields 为空或包含未知字段
+        """
+        self._check_fields(fields)
+        try:
+            data = self._post_list(tid, 1)
+            return {'info': self._parse_thread_info(tid, data), **self._parse_reply_page(data, fields)}
+        except Exception as e:
+            if isinstance(e, HepanException):
+                raise
+            else:
+                print(e)
+                return None
+
+    def get_threads_info(self, tids, workers=8):
+        """
+        并发获取多个主题帖信息
+
+        :param tids: tid列表，重复的tid只请求一次
+        :param workers: 同时请求数，默认8
+        :return:
+            dict: {tid: 帖子信息}，帖子信息同 get_thread_info；获取失败或帖子无法访问时为 None
+        :note:
+            同一个 WebAPI 上同时进行的相同 tid 请求会合并为一次
+        """
+        def fetch(tid):
+            try:
+                return self._coalesce(('thread_info', tid), lambda: self.get_thread_info(tid))
+            except HepanException as e:
+                print(e)
+                return None
+
+        tids = list(dict.fromkeys(tids))
+        with ThreadPoolExecutor(workers) as executor:
+            return dict(zip(tids, executor.map(fetch, tids)))
+
+    def _coalesce(self, key, func):
+        """
+        相同 key 同时只执行一次 func，其余调用等待并共享结果
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return future.result()
+
+    def _post_list(self, tid, page):
+        """
+        请求帖子回复列表接口
+
+        :return:
+            dict: 接口返回的 data
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+        """
+        url = f'https://bbs.uestc.edu.cn/star/api/v1/post/list?thread_id={tid}&page={page}&thread_details=1'
+        r = self._request('GET', url)
+        r.raise_for_status()
+        data = r.json()
+        if data['code'] != 0:
+            raise HepanException(f'{data["message"]} tid={tid}')
+        return data['data']
+
+    def _parse_thread_info(self, tid, data):
+        thread = data['rows'][0]
+        first_paragraph = thread['message'].split('\n')[0].strip()
+        if self.records:
+            return ThreadInfo(tid, thread['subject'], thread['post_id'], first_paragraph, data['total'] - 1,
+                              thread['author'], thread['author_id'], thread['dateline'])
+        return {
+            'tid': tid,
+            'title': thread['subject'],
+            'pid': thread['post_id'],
+            'first_paragraph': first_paragraph,
+            'reply_count': data['total'] - 1,
+            'author': thread['author'],
+            'uid': thread['author_id'],
+            'create_time': thread['dateline']
+        }
+
+    def _check_fields(self, fields):
+        """
+        检查 fields 是否为空或包含未知字段
+        """
+        if fields is None:
+            return
+        known = set(self._reply_key_map.values())
+        if not fields or not known.issuperset(fields):
+            raise ValueError(f'fields 必须是 {sorted(known)} 中的非空子集: {fields!r}')
+
+    def _parse_reply_page(self, data, fields=None):
+        hasNext = data['total'] > data['page'] * data['page_size']
+        rows = data['rows']
+        if self.records and fields is None:
+            replies = [
+                Reply(row['position'], row['post_id'], row['author'], row['author_id'], row['dateline'],
+                      row['message'].strip())
+                for row in rows
+            ]
+            return {'hasNext': hasNext, 'total': data['total'], 'page_size': data['page_size'], 'replies': replies}
+        key_map = self._reply_key_map
+        source_keys = [key for key, field in key_map.items() if fields is None or field in fields]
+        getter = itemgetter(*source_keys) if len(source_keys) > 1 else lambda row: (row[source_keys[0]],)
+        replies = [
+            {
+                key_map[key]: value.strip() if key == 'message' else value
+                for key, value in zip(source_keys, getter(row))
+            }
+            for row in rows
+        ]
+        if self.records:
+            replies = [PartialReply(**reply) for reply in replies]
+        return {'hasNext': hasNext, 'total': data['total'], 'page_size': data['page_size'], 'replies': replies}
+
     def get_reply_all(self, tid, pageLimit=0):
         """
         获取指定主题帖所有回复
@@ -278,18 +1054,221 @@ class WebAPI:
                     - content (str): 回复内容
         :raise:
             HepanException: 帖子不存在/被删除，或无权访问
+        :note:
+            中间某一页获取失败（网络错误等）时不会抛出异常，只返回该页之前的回复，
+            可比较返回数量与 get_thread_info 的 reply_count 判断是否完整
         """
-        replies = []
-        page = 1
+        return list(self.iter_replies(tid, pageLimit=pageLimit))
+
+    def iter_replies(self, tid, start_page=1, fields=None, pageLimit=0):
+        """
+        逐页获取回复并逐个产出，同一时间只保存一页回复
+
+        :param tid: 帖子tid
+        :param start_page: 从第几页开始，默认1
+        :param fields: 回复中需要的字段，如 ('position', 'uid')，默认None，即全部字段
+        :param pageLimit: 最多获取几页，默认0，即不限制
+        :return:
+            generator: 逐个产出回复，格式同 get_reply_all 中的单个回复（只包含 fields 中的字段）
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+            ValueError: fields 为空或包含未知字段
+        :note:
+            某一页获取失败（网络错误等）时不抛出异常，直接结束
+        """
+        self._check_fields(fields)
+        page = start_page
         while True:
-            result = self.get_reply_page(tid, page)
-            hasNext = result['hasNext']
-            replies.extend(result['replies'])
-            if not hasNext or (pageLimit and page >= pageLimit):
-                break
+            result = self.get_reply_page(tid, page, fields)
+            if result is None:
+                return
+            yield from result['replies']
+            if not result['hasNext'] or (pageLimit and page - start_page + 1 >= pageLimit):
+                return
             page += 1
-        return replies
 
+    def watch_replies(self, tid, since_position=1, interval=3, max_interval=60, deadline=None):
+        """
+        持续监听指定主题帖的新回复，每出现一个新楼层产出一次
+
+        :param tid: 帖子tid
+        :param since_position: 从该楼层之后开始产出，默认1，即跳过主帖
+        :param interval: 最短检查间隔，秒，默认3
+        :param max_interval: 没有新回复时，检查间隔逐次翻倍，直到此上限，秒，默认60
+        :param deadline: 截止时间戳（秒），到达后结束监听，默认None，即不限制
+        :return:
+            generator: 逐个产出新回复，格式同 get_reply_all 中的单个回复
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+        :note:
+            只请求最后一页，翻页时立即继续检查下一页，不会重复下载已检查过的页
+        """
+        last_position = since_position
+        page_size = 20
+        page = None
+        positioned = False
+        wait = interval
+        while deadline is None or time.time() < deadline:
+            if page is None:
+                page = last_position // page_size + 1
+            result = self.get_reply_page(tid, page)
+            if result is None:
+                wait = min(wait * 2, max_interval)
+                time.sleep(wait if deadline is None else max(0, min(wait, deadline - time.time())))
+                continue
+            page_size = result['page_size']
+            replies = result['replies']
+            if not positioned:
+                last_page = max(1, -(-result['total'] // page_size))
+                if page > last_page:  # 估算的页码超出范围，直接跳到最后一页
+                    page = last_page
+                    continue
+                if page > 1 and replies and replies[0]['position'] > last_position + 1:  # 有楼层被删除，往前一页
+                    page -= 1
+                    continue
+                positioned = True
+            new_replies = [reply for reply in replies if reply['position'] > last_position]
+            for reply in new_replies:
+                last_position = reply['position']
+                yield reply
+            if result['hasNext']:
+                page += 1
+                continue
+            wait = interval if new_replies else min(wait * 2, max_interval)
+            time.sleep(wait if deadline is None else max(0, min(wait, deadline - time.time())))
+
+    @_instrumented
+    def get_thread_list(self, forum_id, page=1, order=None):
+        """
+        获取板块的主题帖列表（一页）
+
+        :param forum_id: 板块fid
+        :param page: 页码，默认1
+        :param order: 排序方式，如 dateline（按发帖时间倒序），默认None，即论坛默认的按最后回复时间排序
+        :return:
+            dict: 单页数据
+                - hasNext (bool): 是否有下一页
+                - total (int): 主题帖总数
+                - page_size (int): 每页数量
+                - threads (list): 主题帖列表
+                    - dict: 单个主题帖
+                        - tid (int): 帖子tid
+                        - forum_id (int): 板块fid
+                        - title (str): 帖子标题
+                        - author (str): 作者用户名
+                        - uid (int): 作者uid
+                        - create_time (int): 发帖时间戳（秒）
+                        - last_reply_time (int): 最后回复时间戳（秒）
+                        - reply_count (int): 回复数
+        :raise:
+            HepanException: 板块不存在，或无权访问
+        """
+        url = f'https://bbs.uestc.edu.cn/star/api/v1/thread/list?forum_id={forum_id}&page={page}'
+        if order:
+            url += f'&orderby={order}'
+        try:
+            r = self._request('GET', url)
+            r.raise_for_status()
+            data = r.json()
+            if data['code'] != 0:
+                raise HepanException(f'{data["message"]} fid={forum_id}')
+            data = data['data']
+            threads = [{
+                'tid': row['thread_id'],
+                'forum_id': row.get('forum_id', forum_id),
+                'title': row['subject'],
+                'author': row['author'],
+                'uid': row['author_id'],
+                'create_time': row['dateline'],
+                'last_reply_time': row.get('last_post', row['dateline']),
+                'reply_count': row.get('replies', 0)
+            } for row in data['rows']]
+            return {
+                'hasNext': data['page'] * data['page_size'] < data['total'],
+                'total': data['total'],
+                'page_size': data['page_size'],
+                'threads': threads
+            }
+        except Exception as e:
+            if isinstance(e, HepanException):
+                raise
+            else:
+                print(e)
+                return None
+
+    def iter_new_threads(self, forum_ids, since=None, interval=10, max_interval=60, deadline=None, state_file=None,
+                         max_pages=5, workers=8):
+        """
+        持续监听多个板块的新主题帖，每出现一个新帖产出一次
+
+        :param forum_ids: 板块fid列表
+        :param since: 只产出此时间戳（秒，含）之后发的帖子，默认None，即从现在开始；有 state_file 记录时以记录为准
+        :param interval: 最短检查间隔，秒，默认10
+        :param max_interval: 没有新帖时，检查间隔逐次翻倍，直到此上限，秒，默认60
+        :param deadline: 截止时间戳（秒），到达后结束监听，默认None，即不限制
+        :param state_file: 保存各板块进度的json文件路径，默认None，即不保存；重启后从上次的进度继续
+        :param max_pages: 每个板块每次最多检查的页数，默认5
+        :param workers: 同时请求的板块数，默认8
+        :return:
+            generator: 逐个产出新主题帖，格式同 get_thread_list 中的单个主题帖
+        :note:
+            列表按发帖时间倒序请求，每个板块通常只请求第一页，第一页全是新帖时才继续翻页；
+            同一 tid 只产出一次（帖子被移动到其他板块时也一样）
+        """
+        since = int(time.time()) if since is None else since
+        marks = {forum_id: [since, []] for forum_id in forum_ids}  # 板块fid: [已产出的最晚发帖时间, 该时间发的tid]
+        if state_file and os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as f:
+                for forum_id, mark in json.load(f).items():
+                    if int(forum_id) in marks:
+                        marks[int(forum_id)] = mark
+        seen = {}  # 已产出的 tid: 发帖时间，早于所有板块进度的会被清理
+        wait = interval
+
+        def poll(forum_id):
+            mark, mark_tids = marks[forum_id]
+            threads = []
+            for page in range(1, max_pages + 1):
+                try:
+                    result = self.get_thread_list(forum_id, page, order='dateline')
+                except HepanException as e:
+                    print(e)
+                    result = None
+                if result is None:
+                    break
+                threads.extend(thread for thread in result['threads'] if thread['create_time'] > mark or (
+                    thread['create_time'] == mark and thread['tid'] not in mark_tids))
+                # 列表按发帖时间倒序，本页已有不晚于进度的帖子时，之后的页都是旧帖
+                if not result['hasNext'] or any(thread['create_time'] <= mark for thread in result['threads']):
+                    break
+            return sorted(threads, key=itemgetter('create_time', 'tid'))
+
+        with ThreadPoolExecutor(workers) as executor:
+            while deadline is None or time.time() < deadline:
+                count = 0
+                for forum_id, threads in zip(forum_ids, executor.map(poll, forum_ids)):
+                    for thread in threads:
+                        mark = marks[forum_id]
+                        if thread['create_time'] > mark[0]:
+                            mark[0], mark[1] = thread['create_time'], []
+                        mark[1].append(thread['tid'])
+                        if thread['tid'] in seen:
+                            continue
+                        seen[thread['tid']] = thread['create_time']
+                        count += 1
+                        yield thread
+                # 早于所有板块进度的帖子不会再通过进度检查，无需继续记录
+                oldest = min(mark[0] for mark in marks.values())
+                for tid in [tid for tid, create_time in seen.items() if create_time < oldest]:
+                    del seen[tid]
+                if state_file and count:
+                    with open(state_file, 'w', encoding='utf-8') as f:
+                        json.dump(marks, f)
+                wait = interval if count else min(wait * 2, max_interval)
+                time.sleep(wait if deadline is None else max(0, min(wait, deadline - time.time())))
+
+    @_instrumented
+    @_cached
     def get_top_10_post(self):
         """
         获取旧版主页的最新回复，最新发表，今日热门，河畔活动，生活专区，精华展示 前10帖
@@ -313,36 +1292,57 @@ class WebAPI:
                     ! 同 new_reply
         """
         url = 'https://bbs.uestc.edu.cn'
-        r = self.session.get(url)
-        modes = {'new_reply': 'portal_block_66_content',  # 最新回复
-                 'new_post': 'portal_block_67_content',  # 最新发表
-                 'hot': 'portal_block_68_content',  # 今日热门
-                 'activity': 'portal_block_97_content',  # 河畔活动
-                 'live': 'portal_block_96_content',  # 生活专区
-                 'show': 'portal_block_95_content'  # 精华展示
-                 }
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['top_10'])
+        return {key: self._parse_top_10_block(soup.find(id=target)) for key, target in TOP_10_BLOCKS.items()}
+
+    @_instrumented
+    def get_top_10_blocks(self):
+        """
+        获取主页各前10帖区块的原始html，不解析，用于判断区块是否变化
+
+        :return:
+            dict: {区块名: html}，区块名同 get_top_10_post，找不到的区块为 None
+        """
+        url = 'https://bbs.uestc.edu.cn'
+        r = self._request('GET', url)
         result = {}
-        soup = BeautifulSoup(r.text, 'html.parser')
-        for key, target in modes.items():
-            li_elements = soup.find(id=target).find_all('li')
-            temp = []
-            for li in li_elements:
-                em_tag = li.find('em')
-                a_em = em_tag.find('a') if em_tag else None
-                a_title = li.find('a', title=True)
-                uid = int(a_em['href'].split('=')[-1]) if a_em else None
-                uname = a_em.text.strip() if a_em else ''
-                tid = int(a_title['href'].split('=')[-1])
-                title = a_title['title']
-                temp.append({
-                    'tid': tid,
-                    'title': title,
-                    'uid': uid,
-                    'uname': uname
-                })
-            result[key] = temp
+        for key, target in TOP_10_BLOCKS.items():
+            match = re.search(f'<div id="{target}"(?:(?!id="portal_block_).)*?</ul>', r.text, re.S)
+            result[key] = match.group() if match else None
         return result
 
+    def parse_top_10_block(self, html):
+        """
+        解析 get_top_10_blocks 返回的单个区块
+
+        :param html: 区块html
+        :return:
+            list: 帖子列表，格式同 get_top_10_post 中的 new_reply
+        """
+        return self._parse_top_10_block(parse_html(html))
+
+    @staticmethod
+    def _parse_top_10_block(block):
+        result = []
+        for li in block.find_all('li'):
+            em_tag = li.find('em')
+            a_em = em_tag.find('a') if em_tag else None
+            a_title = li.find('a', title=True)
+            uid = int(a_em['href'].split('=')[-1]) if a_em else None
+            uname = a_em.text.strip() if a_em else ''
+            tid = int(a_title['href'].split('=')[-1])
+            title = a_title['title']
+            result.append({
+                'tid': tid,
+                'title': title,
+                'uid': uid,
+                'uname': uname
+            })
+        return result
+
+    @_instrumented
+    @_cached
     def get_darkroom(self):
         """
         获取小黑屋列表
@@ -358,8 +1358,8 @@ class WebAPI:
                     - reason (str): 操作理由
         """
         url = 'https://bbs.uestc.edu.cn/forum.php?mod=misc&action=showdarkroom'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['darkroom'])
         table = soup.find('table', id='darkroomtable')
         rows = table.select('tr[id^="darkroomuid_"]')
         result = []
@@ -371,16 +1371,81 @@ class WebAPI:
             expiration = td[2].text.strip()
             time = td[3].text.strip()
             reason = td[4].text.strip()
-            result.append({
-                'name': name,
-                'uid': uid,
-                'action': action,
-                'expiration': expiration,
-                'time': time,
-                'reason': reason
-            })
+            if self.records:
+                result.append(DarkroomEntry(name, uid, action, expiration, time, reason))
+            else:
+                result.append({
+                    'name': name,
+                    'uid': uid,
+                    'action': action,
+                    'expiration': expiration,
+                    'time': time,
+                    'reason': reason
+                })
         return result
 
+    @_instrumented
+    def get_darkroom_page(self, cursor=0):
+        """
+        分页获取小黑屋记录（即网页中“更多”按钮使用的 json 接口），从新到旧
+
+        :param cursor: 分页位置，默认0，即最新一页；之后传入上一页返回的 cursor
+        :return:
+            dict: 单页记录
+                - entries (list): 小黑屋记录列表，格式同 get_darkroom
+                - cursor (int): 下一页的分页位置，为0时表示没有更多记录
+            网络错误时返回 None
+        :raise:
+            HepanException: 论坛返回提示信息而不是记录（如无权查看）
+        """
+        url = f'https://bbs.uestc.edu.cn/forum.php?mod=misc&action=showdarkroom&cid={cursor}&ajaxdata=json'
+        try:
+            r = self._request('GET', url)
+            r.raise_for_status()
+            data = r.json()
+            message = str(data.get('message', ''))
+            if not re.fullmatch(r'[01]\|\d*', message):  # 不是分页信息，而是论坛的提示（如无权查看）
+                raise HepanException(f'获取小黑屋失败 cid={cursor}: {message}')
+            exist, _, cid = message.partition('|')
+            rows = data.get('data') or {}
+            entries = []
+            for row in (rows.values() if isinstance(rows, dict) else rows):
+                name = row['username']
+                uid = int(row['uid'])
+                action = self._darkroom_text(row['action'])
+                expiration = self._darkroom_text(row['groupexpiry'])
+                time = self._darkroom_text(row['dateline'])
+                reason = self._darkroom_text(row['reason'])
+                if self.records:
+                    entries.append(DarkroomEntry(name, uid, action, expiration, time, reason))
+                else:
+                    entries.append({
+                        'name': name,
+                        'uid': uid,
+                        'action': action,
+                        'expiration': expiration,
+                        'time': time,
+                        'reason': reason
+                    })
+            return {'entries': entries, 'cursor': int(cid) if exist == '1' and cid else 0}
+        except Exception as e:
+            if isinstance(e, HepanException):
+                raise
+            else:
+                print(e)
+                return None
+
+    @staticmethod
+    def _darkroom_text(value):
+        """
+        json 接口中的时间可能是 <span title="完整时间">x 分钟前</span>，取完整时间并去掉标签
+        """
+        value = str(value)
+        match = re.search(r'title="([^"]+)"', value)
+        return match.group(1) if match else re.sub(r'<[^>]+>', '', value).strip()
+
+    @_instrumented
+    @_cached
     def get_user_rank(self, sub_rank, order=''):
         """
         获取用户排行榜
@@ -426,8 +1491,8 @@ class WebAPI:
         """
 
         url = f'https://bbs.uestc.edu.cn/misc.php?mod=ranklist&type=member&view={sub_rank}&orderby={order}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['rank'])
         rows = soup.find_all(class_='bbda cl')
         data = []
         for i in rows:
@@ -440,15 +1505,20 @@ class WebAPI:
             name = i.contents[-4].text.strip()
             uid = int(user_dt['href'].split('=')[-1])
             msg = i.contents[-2].text.strip()
-            data.append({
-                'rank': int(rank),
-                'name': name,
-                'uid': uid,
-                'msg': msg
-            })
+            if self.records:
+                data.append(RankEntry(int(rank), name, uid, msg))
+            else:
+                data.append({
+                    'rank': int(rank),
+                    'name': name,
+                    'uid': uid,
+                    'msg': msg
+                })
         notice = soup.find(class_='notice').text.strip()
         return {'notice': notice, 'data': data}
 
+    @_instrumented
+    @_cached
     def get_thread_rank(self, sub_rank, order='all'):
         """
         获取帖子排行榜
@@ -463,6 +1533,7 @@ class WebAPI:
                     - dict: 单个帖子数据
                         - rank (int): 排名
                         - title (str): 帖子标题
+                        - tid (int): 帖子tid
                         - forum (str): 帖子所在板块名称
                         - author (str): 发帖人
                         - uid (int): 发帖人uid
@@ -491,8 +1562,8 @@ class WebAPI:
                     同 sub_rank = 'replies'
         """
         url = f'https://bbs.uestc.edu.cn/misc.php?mod=ranklist&type=thread&view={sub_rank}&orderby={order}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['rank'])
         rows = soup.find('table').find_all('tr')
         data = []
         for i in rows[1:]:
@@ -501,7 +1572,10 @@ class WebAPI:
                 rank = rank['alt']
             else:
                 rank = ranknum.text.strip()
-            title = i.find('th').text.strip()
+            th = i.find('th')
+            title = th.text.strip()
+            tid = re.search(r'tid=(\d+)', th.a['href']) if th.a else None
+            tid = int(tid.group(1)) if tid else None
             forum = i.find('td', class_='frm').text.strip()
             thread_i = i.find('td', class_='by')
             auth_i = thread_i.find('a')
@@ -509,18 +1583,24 @@ class WebAPI:
             uid = int(auth_i['href'].split('=')[-1])
             time = thread_i.find('em').text.strip()
             count = i.contents[-2].text.strip()
-            data.append({
-                'rank': int(rank),
-                'title': title,
-                'forum': forum,
-                'author': author,
-                'uid': uid,
-                'time': time,
-                'count': int(count)
-            })
+            if self.records:
+                data.append(ThreadRankEntry(int(rank), title, tid, forum, author, uid, time, int(count)))
+            else:
+                data.append({
+                    'rank': int(rank),
+                    'title': title,
+                    'tid': tid,
+                    'forum': forum,
+                    'author': author,
+                    'uid': uid,
+                    'time': time,
+                    'count': int(count)
+                })
         notice = soup.find('div', class_='notice').text.strip()
         return {'notice': notice, 'data': data}
 
+    @_instrumented
+    @_cached
     def get_pool_rank(self, sub_rank, order=''):
         """
         获取投票贴排行榜
@@ -555,8 +1635,8 @@ class WebAPI:
                     = 'today': 今日
         """
         url = f'https://bbs.uestc.edu.cn/misc.php?mod=ranklist&type=poll&view={sub_rank}&orderby={order}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['rank'])
         table = soup.find('ul', class_='el pll')
         rows = table.find_all('li')
         data = []
@@ -578,19 +1658,24 @@ class WebAPI:
             count = extra_info.contents[0].strip()[3:]
             time = extra_info.contents[-1].strip()
             voters = i.find(class_='s y').find('span').text.strip()
-            data.append({
-                'rank': int(rank),
-                'author': author,
-                'uid': uid,
-                'title': title,
-                'tid': tid,
-                'count': count,
-                'time': time,
-                'voters': int(voters)
-            })
+            if self.records:
+                data.append(PoolRankEntry(int(rank), author, uid, title, tid, count, time, int(voters)))
+            else:
+                data.append({
+                    'rank': int(rank),
+                    'author': author,
+                    'uid': uid,
+                    'title': title,
+                    'tid': tid,
+                    'count': count,
+                    'time': time,
+                    'voters': int(voters)
+                })
         notice = soup.find('div', class_='notice').text.strip()
         return {'notice': notice, 'data': data}
 
+    @_instrumented
+    @_cached
     def get_forum_rank(self, sub_rank):
         """
         获取板块排行榜
@@ -616,8 +1701,8 @@ class WebAPI:
             = 'today': 最近24小时发帖
         """
         url = f'https://bbs.uestc.edu.cn/misc.php?mod=ranklist&type=forum&view={sub_rank}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['rank'])
         rows = soup.find('table').find_all('tr')
         data = []
         for i in rows[1:]:
@@ -628,16 +1713,19 @@ class WebAPI:
                 rank = ranknum.text.strip()
             forum = i.find('th').text.strip()
             count = i.contents[-2].text.strip()
-            data.append(
-                {
+            if self.records:
+                data.append(ForumRankEntry(int(rank), forum, int(count)))
+            else:
+                data.append({
                     'rank': int(rank),
                     'forum': forum,
                     'count': int(count)
-                }
-            )
+                })
         notice = soup.find('div', class_='notice').text.strip()
         return {'notice': notice, 'data': data}
 
+    @_instrumented
+    @_cached
     def get_task_list(self, mode='new'):
         """
         获取任务列表
@@ -653,8 +1741,8 @@ class WebAPI:
                     - reward (str): 任务奖励
         """
         url = f'https://bbs.uestc.edu.cn/home.php?mod=task&item={mode}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['task'])
         table = soup.find('div', class_='bm bw0').find('table')
         if not table:
             return []
@@ -676,6 +1764,7 @@ class WebAPI:
             })
         return result
 
+    @_instrumented
     def apply_task(self, task_id):
         """
         申请任务
@@ -688,14 +1777,10 @@ class WebAPI:
                 - str: 提示信息
         """
         url = f'https://bbs.uestc.edu.cn/home.php?mod=task&do=apply&id={task_id}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
-        if msg := soup.find('div', id='messagetext', class_='alert_info'):
-            if '任务申请成功' in msg.text:
-                return True, msg.text.strip()
-            else:
-                return False, msg.text.strip()
+        r = self._request('GET', url)
+        return self._task_message(r, '任务申请成功')
 
+    @_instrumented
     def finish_task(self, task_id):
         """
         完成任务，领取奖励
@@ -708,14 +1793,25 @@ class WebAPI:
                 - str: 提示信息
         """
         url = f'https://bbs.uestc.edu.cn/home.php?mod=task&do=draw&id={task_id}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
-        if msg := soup.find('div', id='messagetext', class_='alert_info'):
-            if '任务已成功完成' in msg.text:
-                return True, msg.text.strip()
-            else:
-                return False, msg.text.strip()
+        r = self._request('GET', url)
+        return self._task_message(r, '任务已成功完成')
+
+    @staticmethod
+    def _task_message(r, success_text):
+        """
+        解析申请/领取任务后的提示信息
+
+        :return:
+            tuple: (是否成功, 提示信息)，没有提示信息时为 (False, 网页标题)
+        """
+        soup = parse_html(r.text, STRAINERS['message'])
+        if msg := soup.find('div', id='messagetext'):
+            text = msg.text.strip()
+            return success_text in text, text
+        title = re.search(r'<title>(.*?)</title>', r.text, re.S)
+        return False, title.group(1).strip() if title else f'未知响应 HTTP {r.status_code}'
 
+    @_instrumented
     def get_task_info(self, task_id):
         """
         获取任务详细信息
@@ -731,13 +1827,14 @@ class WebAPI:
                 - requirement (str): 申请此任务所需条件
                 - status (str): 任务状态 doing/done/applicable
                 - progress (str): 任务进度
+                - claimable (bool): 是否已完成、可以领取奖励
         :note:
             progress: 只有进行中的任务会返回具体进度
 
         """
         url = f'https://bbs.uestc.edu.cn/home.php?mod=task&do=view&id={task_id}'
-        r = self.session.get(url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._request('GET', url)
+        soup = parse_html(r.text, STRAINERS['task'])
         table = soup.find('div', class_='bm bw0').find('table')
         rows = table.find_all('tr')
         task_i = rows[0].find('td', class_='bbda')
@@ -749,10 +1846,12 @@ class WebAPI:
         mission = sub_rows[1].find('td', class_='bbda').text.strip()
         requirement = sub_rows[2].find('td', class_='bbda').text.strip()
         img = rows[-2].find_all('img')[-1]
+        claimable = False
         if img:
             if img['src'] in ['static/image/task/cancel.gif', 'static/image/task/reward.gif']:
                 status = 'doing'
                 progress = rows[-2].find('span', id=f'csc_{task_id}').text.strip()
+                claimable = img['src'] == 'static/image/task/reward.gif'
             else:
                 status = 'applicable' if img['src'] == 'static/image/task/apply.gif' else 'not applicable'
                 progress = rows[-2].find('p', class_='xg2 mbn').text.strip()
@@ -766,29 +1865,345 @@ class WebAPI:
             'mission': mission,
             'requirement': requirement,
             'status': status,
-            'progress': progress
+            'progress': progress,
+            'claimable': claimable
         }
 
-    def edit_post(self, tid, pid, title, message, editingThread):
+    @_instrumented
+    def get_post_meta(self, tid, pid, position=None, refresh=False):
+        """
+        获取编辑帖子所需的元数据，结果会缓存，同一帖子只请求一次
+
+        :param tid: 帖子tid
+        :param pid: 帖子或回复pid
+        :param position: 回复所在楼层（可选），用于直接定位所在页
+        :param refresh: 是否忽略缓存重新获取，默认False
+        :return:
+            dict: 帖子元数据
+                - subject (str): 当前标题
+                - format (int): 内容格式
+                - smileyoff (int): 是否禁用表情
+                - usesig (int): 是否显示签名
+                - is_anonymous (bool): 是否匿名
+                - type_id (int): 主题分类id
+                - attachments (list): 附件
+                - editingThread (bool): 是否为主帖（编辑主帖时可修改标题）
+        :raise:
+            HepanException: 帖子不存在/被删除，无权访问，或帖子中没有此pid
+        :note:
+            先查找 position 所在页（未指定时为第一页，编辑主帖只需一次请求），找不到时从最后一页往前查找；
+            接口返回的字段名未经完整验证，缺少的字段使用原先固定的值（水区纯文本帖）
+        """
+        key = (tid, pid)
+        if not refresh and key in self._post_meta:
+            return self._post_meta[key]
+        page = 1 if position is None else (position - 1) // 20 + 1  # 每页楼层数以第一次请求返回的为准
+        visited = set()
+        last_page = None
+        while True:
+            data = self._post_list(tid, page)
+            visited.add(page)
+            thread = data.get('thread') or {}
+            for row in data['rows']:
+                if row['post_id'] != pid:
+                    continue
+                meta = {
+                    'subject': row.get('subject') or (thread.get('subject', '') if row['position'] == 1 else ''),
+                    'format': row.get('format', 2),
+                    'smileyoff': row.get('smileyoff', -1),
+                    'usesig': row.get('usesig', 1),
+                    'is_anonymous': bool(row.get('is_anonymous', False)),
+                    'type_id': thread.get('type_id', 315),
+                    'attachments': row.get('attachments') or [],
+                    'editingThread': row['position'] == 1,
+                }
+                self._post_meta[key] = meta
+                return meta
+            if last_page is None:
+                last_page = max(1, -(-data['total'] // data['page_size']))
+                if position is not None:  # 按实际每页楼层数重新定位
+                    hinted = (position - 1) // data['page_size'] + 1
+                    if hinted not in visited and hinted <= last_page:
+                        page = hinted
+                        continue
+            page = next((p for p in range(last_page, 0, -1) if p not in visited), None)
+            if page is None:
+                raise HepanException(f'帖子中没有此回复 tid={tid}, pid={pid}')
+
+    @_instrumented
+    def edit_post(self, tid, pid, title, message, editingThread=None, force=False, position=None):
         """
-        注意：此函数功能还不完善，目前仅适用于水区纯文本灌水帖
+        编辑帖子或回复，格式、主题分类、附件等保持不变
+
+        :param tid: 帖子tid
+        :param pid: 帖子或回复pid
+        :param title: 新标题，None 表示保持当前标题
+        :param message: 新内容
+        :param editingThread: 是否为主帖，默认None，即根据 get_post_meta 判断
+        :param force: 内容与上一次提交相同时是否仍然提交，默认False，即跳过
+        :param position: 回复所在楼层（可选），首次编辑时用于快速定位，见 get_post_meta
+        :return:
+            dict: 接口返回的json；与上一次提交相同而跳过时返回 None
+        :raise:
+            HepanException: 编辑失败，异常信息为服务器的提示
         """
+        meta = self._coalesce(('post_meta', tid, pid), lambda: self.get_post_meta(tid, pid, position))
+        title = meta['subject'] if title is None else title
+        if not force and self._last_edit.get((tid, pid)) == (title, message):
+            return None
         url = 'https://bbs.uestc.edu.cn/star/api/v1/post/edit'
         payload = {
             "thread_id": tid,
             "post_id": pid,
             "subject": title,
             "message": message,
-            "format": 2,
-            "smileyoff": -1,
-            "usesig": 1,
-            "is_anonymous": False,
-            "type_id": 315,
-            "attachments": [],
-            "editingThread": editingThread
+            "format": meta['format'],
+            "smileyoff": meta['smileyoff'],
+            "usesig": meta['usesig'],
+            "is_anonymous": meta['is_anonymous'],
+            "type_id": meta['type_id'],
+            "attachments": meta['attachments'],
+            "editingThread": meta['editingThread'] if editingThread is None else editingThread
         }
-        r = self.session.post(url, json=payload)
+        r = self._request('POST', url, json=payload)
         r = r.json()
         if r['code']:
+            self._post_meta.pop((tid, pid), None)  # 元数据可能已变化，下次重新获取
             raise HepanException(r['message'])
+        self._last_edit[(tid, pid)] = (title, message)
+        meta['subject'] = title
         return r
+
+    def edit_many(self, jobs, workers=4):
+        """
+        批量编辑帖子，单个失败不会中断其他编辑
+
+        :param jobs: 编辑任务列表，每项为 (tid, pid, title, message) 或 (tid, pid, title, message, position)，
+            title 为 None 表示保持当前标题，position 为回复所在楼层
+        :param workers: 同时提交的编辑数，默认4
+        :return:
+            list: 每项的结果，顺序与 jobs 相同
+                - dict: 单个编辑结果
+                    - tid, pid, title: 同 jobs
+                    - content (str): 同 jobs 中的 message
+                    - status (str): success/failed/skipped
+                    - message (str): 失败或跳过的原因
+        """
+        def submit(job):
+            tid, pid, title, message, *position = job
+            result = {'tid': tid, 'pid': pid, 'title': title, 'content': message}
+            try:
+                if self.edit_post(tid, pid, title, message, position=position[0] if position else None) is None:
+                    return {**result, 'status': 'skipped', 'message': '内容与上一次提交相同'}
+                return {**result, 'status': 'success', 'message': ''}
+            except HepanException as e:
+                return {**result, 'status': 'failed', 'message': e.message}
+            except Exception as e:
+                return {**result, 'status': 'failed', 'message': str(e)}
+
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(submit, jobs))
+
+
+class RatingQueue:
+    """
+    批量评分队列
+
+    按 pid 去重，统计每日评分总额和每个用户当日获得的评分，按固定间隔依次提交
+    指定 state_file 时，额度和已评分的 pid 会保存到文件，重启后继续累计
+    """
+
+    def __init__(self, api, daily_limit=400, user_limit=0, interval=1, state_file=None):
+        """
+        初始化
+
+        :param api: 已登录的 WebAPI
+        :param daily_limit: 每日评分总额上限（水滴数绝对值之和），默认400
+        :param user_limit: 单个用户每日最多获得的评分（水滴数绝对值之和），默认0，即不限制，需在任务中提供uid
+        :param interval: 两次提交之间的最短间隔，秒，默认1
+        :param state_file: 保存额度的json文件路径，默认None，即不保存
+        """
+        self.api = api
+        self.daily_limit = daily_limit
+        self.user_limit = user_limit
+        self.interval = interval
+        self.state_file = state_file
+        self.jobs = []
+        self.last_submit = 0
+        self.state = {'date': '', 'used': 0, 'users': {}, 'pids': []}
+        if state_file and os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as f:
+                self.state.update(json.load(f))
+        self.done_pids = set(self.state['pids'])
+
+    def _save(self):
+        if not self.state_file:
+            return
+        self.state['pids'] = list(self.done_pids)
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+
+    def _check_date(self):
+        today = datetime.now(FORUM_TZ).strftime('%Y-%m-%d')  # 论坛按北京时间重置每日额度
+        if self.state['date'] != today:
+            self.state.update({'date': today, 'used': 0, 'users': {}})
+
+    def remaining(self, uid=None):
+        """
+        今日剩余评分额度
+
+        :param uid: 用户uid，默认None，即只计算总额度
+        :return:
+            int: 剩余可评分的水滴数
+        """
+        self._check_date()
+        remaining = self.daily_limit - self.state['used']
+        if uid is not None and self.user_limit:
+            remaining = min(remaining, self.user_limit - self.state['users'].get(str(uid), 0))
+        return max(remaining, 0)
+
+    def add(self, tid, pid, score, reason='', uid=None):
+        """
+        添加一个评分任务
+
+        :param tid: （回复所在）帖子tid
+        :param pid: 帖子或回复pid
+        :param score: 水滴数，负数表示扣水
+        :param reason: 操作理由（默认空）
+        :param uid: 被评分用户uid，设置了 user_limit 时用于统计单用户额度
+        """
+        self.jobs.append({'tid': tid, 'pid': pid, 'score': score, 'reason': reason, 'uid': uid})
+
+    def run(self):
+        """
+        依次提交队列中的所有任务
+
+        :return:
+            list: 每个任务的结果，顺序与添加顺序相同
+                - dict: 单个任务结果
+                    - tid, pid, score, reason, uid: 同 add
+                    - status (str): success/failed/skipped
+                    - message (str): 失败或跳过的原因
+        """
+        results = []
+        while self.jobs:
+            job = self.jobs.pop(0)
+            status, message = self._submit(job)
+            results.append({**job, 'status': status, 'message': message})
+        return results
+
+    def _submit(self, job):
+        if job['pid'] in self.done_pids:
+            return 'skipped', '已评分过此帖'
+        amount = abs(job['score'])
+        if amount > self.remaining():
+            return 'skipped', f'今日评分额度不足，剩余{self.remaining()}'
+        if amount > self.remaining(job['uid']):
+            return 'skipped', f'用户 {job["uid"]} 今日获得评分已达上限'
+        wait = self.last_submit + self.interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self.last_submit = time.time()
+        try:
+            if not self.api.rate(job['tid'], job['pid'], job['score'], job['reason']):
+                return 'failed', '网络错误'
+        except HepanException as e:
+            return 'failed', e.message
+        self.done_pids.add(job['pid'])
+        self.state['used'] += amount
+        if job['uid'] is not None:
+            uid = str(job['uid'])
+            self.state['users'][uid] = self.state['users'].get(uid, 0) + amount
+        self._save()
+        return 'success', ''
+
+
+class AsyncWebAPI:
+    """
+    河畔网页API（asyncio 版本）
+
+    方法与 WebAPI 一一对应，在线程池中执行同名方法，调用时需要 await；
+    生成器方法（iter_replies、watch_replies、iter_new_threads）对应异步生成器，需要用 async for 迭代，
+    每一项都在线程池中获取，不会阻塞事件循环
+    get_reply_all 会先读取第一页的总楼层数，再并发获取剩余各页
+    设置属性（如 records、cache）时直接设置在内部的 WebAPI 上
+    """
+    _own = ('api', 'concurrency')  # 保存在本对象上的属性，其余属性读写都转发给 WebAPI
+
+    def __init__(self, username, password, autoLogin=True, concurrency=8, transport=None, **kwargs):
+        """
+        初始化
+
+        :param username: 用户名
+        :param password: 密码
+        :param autoLogin: 是否在初始化后自动登录，默认True
+        :param concurrency: get_reply_all 同时请求的最大页数，默认8
+        :param transport: 共用的 Transport，默认None，即单独创建一个
+        :param kwargs: 传给 WebAPI 的其他参数，如 cache, session_file
+        """
+        self.api = WebAPI(username, password, autoLogin, transport, **kwargs)
+        self.concurrency = concurrency
+
+    def __getattr__(self, name):
+        attr = getattr(self.api, name)
+        if not callable(attr):
+            return attr
+
+        if inspect.isgeneratorfunction(inspect.unwrap(attr)):
+            async def method(*args, **kwargs):
+                generator = attr(*args, **kwargs)
+                end = object()
+                try:
+                    while True:
+                        item = await asyncio.to_thread(next, generator, end)
+                        if item is end:
+                            return
+                        yield item
+                finally:
+                    await asyncio.to_thread(generator.close)
+        else:
+            async def method(*args, **kwargs):
+                return await asyncio.to_thread(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    def __setattr__(self, name, value):
+        if name in self._own:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.api, name, value)
+
+    async def get_reply_all(self, tid, pageLimit=0):
+        """
+        并发获取指定主题帖所有回复
+
+        :param tid: 帖子tid
+        :param pageLimit: 最多获取几页，默认0，即不限制
+        :return:
+            list: 回复列表，按楼层排序，格式同 WebAPI.get_reply_all
+            获取某一页失败时返回 None
+        :raise:
+            HepanException: 帖子不存在/被删除，或无权访问
+        """
+        first = await asyncio.to_thread(self.api.get_reply_page, tid, 1)
+        if first is None:
+            return None
+        page_count = -(-first['total'] // first['page_size'])
+        if pageLimit:
+            page_count = min(page_count, pageLimit)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(page):
+            async with semaphore:
+                return await asyncio.to_thread(self.api.get_reply_page, tid, page)
+
+        results = await asyncio.gather(*(fetch(page) for page in range(2, page_count + 1)))
+        if any(result is None for result in results):
+            return None
+        replies = list(first['replies'])
+        for result in results:
+            replies.extend(result['replies'])
+        replies.sort(key=itemgetter('position'))
+        return replies
@@ -0,0 +1,275 @@
+"""
+WebAPI 离线性能测试
+
+fixtures/ 中保存了各接口的网页/json，测试分两部分：
+    parse: 直接用保存的响应调用接口，只统计解析耗时和内存峰值
+    request: 启动本地 HTTP 服务器回放响应，统计包含网络请求的完整耗时
+
+用法：
+    python benchmark/bench.py                          运行并输出结果
+    python benchmark/bench.py --save baseline.json     运行并保存为基准
+    python benchmark/bench.py --compare baseline.json  运行并与基准对比，变慢超过阈值时返回1
+    python benchmark/bench.py --record 用户名 密码 [tid] 登录后重新录制 fixtures
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import WebAPI  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASE_URL = 'https://bbs.uestc.edu.cn'
+TID = 2287221
+
+CASES = {  # 接口: (调用方式, fixture)
+    'get_thread_info': (lambda api: api.get_thread_info(TID), 'post_list.json'),
+    'get_reply_page': (lambda api: api.get_reply_page(TID, 1), 'post_list.json'),
+    'get_top_10_post': (lambda api: api.get_top_10_post(), 'top_10.html'),
+    'get_darkroom': (lambda api: api.get_darkroom(), 'darkroom.html'),
+    'get_user_rank': (lambda api: api.get_user_rank('credit', 'all'), 'user_rank.html'),
+    'get_thread_rank': (lambda api: api.get_thread_rank('replies', 'all'), 'thread_rank.html'),
+    'get_pool_rank': (lambda api: api.get_pool_rank('heats', 'all'), 'pool_rank.html'),
+    'get_forum_rank': (lambda api: api.get_forum_rank('threads'), 'forum_rank.html'),
+    'get_task_list': (lambda api: api.get_task_list('new'), 'task_list.html'),
+    'get_task_info': (lambda api: api.get_task_info(1), 'task_info.html'),
+    'apply_task': (lambda api: api.apply_task(1), 'task_apply.html'),
+    'finish_task': (lambda api: api.finish_task(1), 'task_draw.html'),
+}
+
+RECORD_URLS = {  # fixture: 录制地址
+    'post_list.json': f'{BASE_URL}/star/api/v1/post/list?thread_id={{tid}}&page=1&thread_details=1',
+    'top_10.html': BASE_URL,
+    'darkroom.html': f'{BASE_URL}/forum.php?mod=misc&action=showdarkroom',
+    'user_rank.html': f'{BASE_URL}/misc.php?mod=ranklist&type=member&view=credit&orderby=all',
+    'thread_rank.html': f'{BASE_URL}/misc.php?mod=ranklist&type=thread&view=replies&orderby=all',
+    'pool_rank.html': f'{BASE_URL}/misc.php?mod=ranklist&type=poll&view=heats&orderby=all',
+    'forum_rank.html': f'{BASE_URL}/misc.php?mod=ranklist&type=forum&view=threads',
+    'task_list.html': f'{BASE_URL}/home.php?mod=task&item=new',
+    'task_info.html': f'{BASE_URL}/home.php?mod=task&do=view&id={{task_id}}',
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def content_type(name):
+    return 'application/json' if name.endswith('.json') else 'text/html; charset=utf-8'
+
+
+def route(url):
+    """
+    按请求地址选择 fixture
+
+    :return:
+        str: fixture 文件名
+    """
+    parts = urlsplit(url)
+    query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+    if parts.path == '/star/api/v1/post/list':
+        return 'post_list.json'
+    if parts.path == '/misc.php' and query.get('mod') == 'ranklist':
+        return {'member': 'user_rank.html', 'thread': 'thread_rank.html', 'poll': 'pool_rank.html',
+                'forum': 'forum_rank.html'}[query['type']]
+    if parts.path == '/forum.php' and query.get('action') == 'showdarkroom':
+        return 'darkroom.html'
+    if parts.path == '/home.php' and query.get('mod') == 'task':
+        return {'view': 'task_info.html', 'apply': 'task_apply.html', 'draw': 'task_draw.html'}.get(
+            query.get('do'), 'task_list.html')
+    return 'top_10.html'
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    回放 fixtures 的本地服务器
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        name = route(self.path)
+        body = load_fixture(name)
+        if name == 'post_list.json':  # 按请求的页码返回
+            page = parse_qs(urlsplit(self.path).query).get('page', ['1'])[0]
+            data = json.loads(body)
+            data['data']['page'] = int(page)
+            body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type(name))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    将发往河畔的请求改发到本地服务器
+    """
+
+    def __init__(self, local_url, **kwargs):
+        super().__init__(**kwargs)
+        self.local_url = local_url
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(BASE_URL, self.local_url, 1)
+        return super().send(request, **kwargs)
+
+
+class ReplayTransport(WebAPI.Transport):
+    """
+    使用 ReplayAdapter 的 Transport
+    """
+
+    def __init__(self, local_url):
+        super().__init__()
+        self.adapter = ReplayAdapter(local_url)
+
+
+def fixture_response(name):
+    r = requests.Response()
+    r.status_code = 200
+    r._content = load_fixture(name)
+    r.headers['Content-Type'] = content_type(name)
+    r.encoding = 'utf-8'
+    r.url = BASE_URL
+    return r
+
+
+def measure(func, rounds):
+    """
+    :return:
+        tuple: (平均耗时 ms, 内存峰值 KB)
+    """
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_parse(rounds):
+    api = WebAPI.WebAPI('benchmark', '', autoLogin=False)
+    results = {}
+    for name, (call, fixture) in CASES.items():
+        response = fixture_response(fixture)
+        api._request = lambda *args, **kwargs: response
+        results[name] = measure(lambda: call(api), rounds)
+    return results
+
+
+def bench_request(rounds):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        transport = ReplayTransport(f'http://127.0.0.1:{server.server_address[1]}')
+        api = WebAPI.WebAPI('benchmark', '', autoLogin=False, transport=transport)
+        return {name: measure(lambda: call(api), rounds) for name, (call, _) in CASES.items()}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run(parse_rounds, request_rounds):
+    """
+    :return:
+        dict: {接口: {'parse_ms', 'parse_kb', 'request_ms'}}
+    """
+    parse = bench_parse(parse_rounds)
+    request = bench_request(request_rounds)
+    return {
+        name: {'parse_ms': parse[name][0], 'parse_kb': parse[name][1], 'request_ms': request[name][0]}
+        for name in CASES
+    }
+
+
+def report(results, baseline=None, threshold=0.2):
+    """
+    输出结果，有基准时输出变化比例
+
+    :return:
+        list: 变慢超过阈值的 (接口, 指标, 变化比例)
+    """
+    regressions = []
+    print(f'解析器: {WebAPI.HTML_PARSER}')
+    print(f'{"接口":<18}{"解析ms":>10}{"内存KB":>10}{"请求ms":>10}')
+    for name, result in results.items():
+        line = f'{name:<18}{result["parse_ms"]:>10.3f}{result["parse_kb"]:>10.0f}{result["request_ms"]:>10.3f}'
+        if baseline and name in baseline:
+            changes = []
+            for key, value in result.items():
+                old = baseline[name].get(key)
+                if not old:
+                    continue
+                change = value / old - 1
+                changes.append(f'{key} {change:+.0%}')
+                if change > threshold:
+                    regressions.append((name, key, change))
+            line += '  ' + ', '.join(changes)
+        print(line)
+    for name, key, change in regressions:
+        print(f'变慢: {name} {key} {change:+.0%}')
+    return regressions
+
+
+def record(username, password, tid, task_id=1):
+    """
+    登录后重新录制 fixtures（不含 task_apply/task_draw，申请和领取任务会产生实际效果）
+    """
+    api = WebAPI.WebAPI(username, password)
+    for name, url in RECORD_URLS.items():
+        r = api._request('GET', url.format(tid=tid, task_id=task_id))
+        r.raise_for_status()
+        with open(os.path.join(FIXTURE_DIR, name), 'wb') as f:
+            f.write(r.content)
+        print(f'已录制 {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WebAPI 离线性能测试')
+    parser.add_argument('--parse-rounds', type=int, default=50, help='解析测试次数，默认50')
+    parser.add_argument('--request-rounds', type=int, default=20, help='请求测试次数，默认20')
+    parser.add_argument('--save', metavar='FILE', help='将结果保存为基准')
+    parser.add_argument('--compare', metavar='FILE', help='与基准对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定变慢的比例，默认0.2')
+    parser.add_argument('--record', nargs='+', metavar=('USERNAME', 'PASSWORD'), help='用户名 密码 [tid]')
+    args = parser.parse_args()
+    if args.record:
+        username, password, *rest = args.record
+        record(username, password, int(rest[0]) if rest else TID)
+        return 0
+    results = run(args.parse_rounds, args.request_rounds)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
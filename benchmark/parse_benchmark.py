@@ -0,0 +1,64 @@
+"""
+网页解析性能对比：完整 html.parser 解析 vs parse_html（lxml + 按需解析）
+
+用法：
+    python benchmark/parse_benchmark.py
+网页使用 benchmark/fixtures/ 中录制的 fixtures，重新录制见 bench.py --record
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup  # noqa: E402
+import WebAPI  # noqa: E402
+
+PAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGES = {  # 网页类型（即 fixtures 文件名）: 解析范围
+    'top_10': 'top_10',
+    'darkroom': 'darkroom',
+    'user_rank': 'rank',
+    'thread_rank': 'rank',
+    'pool_rank': 'rank',
+    'forum_rank': 'rank',
+    'task_list': 'task',
+}
+ROUNDS = 20
+
+
+def measure(func, text):
+    """
+    :return:
+        tuple: (平均耗时 ms, 内存峰值 KB)
+    """
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(text)
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    tracemalloc.start()
+    soup = func(text)  # noqa: F841
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    print(f'解析器: {WebAPI.HTML_PARSER}，每项 {ROUNDS} 次取平均')
+    print(f'{"网页":<12}{"大小KB":>8}{"完整ms":>10}{"按需ms":>10}{"完整KB":>10}{"按需KB":>10}')
+    for name, strainer in PAGES.items():
+        path = os.path.join(PAGE_DIR, f'{name}.html')
+        if not os.path.exists(path):
+            print(f'{name:<12}缺少网页，请先录制 fixtures')
+            continue
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        full_time, full_mem = measure(lambda t: BeautifulSoup(t, 'html.parser'), text)
+        fast_time, fast_mem = measure(lambda t: WebAPI.parse_html(t, WebAPI.STRAINERS[strainer]), text)
+        print(f'{name:<12}{len(text.encode()) / 1024:>8.1f}{full_time:>10.2f}{fast_time:>10.2f}'
+              f'{full_mem:>10.0f}{fast_mem:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
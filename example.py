@@ -5,6 +5,11 @@ password = 'your_password'
 
 # 网页API
 api = WebAPI.WebAPI(username, password)
+# 保存登录状态，下次启动时若仍有效则跳过登录：
+# api = WebAPI.WebAPI(username, password, session_file='session.json')
+# 多个脚本同时运行时，可通过同一个文件共同限速：
+# transport = WebAPI.Transport(limiter=WebAPI.RateLimiter(path='ratelimit.db'))
+# api = WebAPI.WebAPI(username, password, transport=transport)
 tid = 2287221
 print('获取帖子基本信息 :', api.get_thread_info(tid))
 print('获取单页回复 :', api.get_reply_page(tid))
@@ -20,3 +25,81 @@ print('获取最近24小时用户发帖数排行 :', api.get_user_rank('post', '
 print('获取帖子今日回复排行 :', api.get_thread_rank('replies', 'today'))
 print('获取投票帖今日热度排行 :', api.get_pool_rank('heats', 'today'))
 print('获取近24小时发帖板块排行 ：', api.get_forum_rank('today'))
+
+# 异步API，get_reply_all 并发获取各页
+import asyncio
+
+async_api = WebAPI.AsyncWebAPI(username, password)
+print('并发获取帖子所有回复 :', asyncio.run(async_api.get_reply_all(tid)))
+
+
+async def print_replies():
+    async for reply in async_api.iter_replies(tid, fields=('position', 'uid')):
+        print(reply)
+
+asyncio.run(print_replies())
+
+# 本地存档，重复同步只获取新回复
+import Archive
+
+archive = Archive.ThreadArchive('archive.db', api)
+print('同步帖子，新增回复数 :', archive.sync_thread(tid))
+print('离线查询回复 :', archive.get_replies(tid, 1, 10))
+
+# 逐页获取回复，只保留需要的字段，适合直接写入文件
+for reply in api.iter_replies(tid, fields=('position', 'uid')):
+    print(reply)
+
+# 统计各接口的请求次数、网络耗时和解析耗时
+import Metrics
+
+metrics = Metrics.Metrics()
+api.hooks.append(metrics)
+api.get_user_rank('credit')
+print('各接口耗时 :', metrics.summary())
+print(metrics.to_prometheus())
+
+# 保存排行榜快照，比较排名变化
+import RankSnapshot
+
+ranks = RankSnapshot.RankSnapshotStore('rank.db', api)
+old = ranks.latest('user:credit:all')
+new = ranks.capture('user', 'credit', 'all')
+if old is not None and new is not None:
+    print('排行榜变化 :', ranks.diff(old, new))
+print('uid 为 1 的用户排名历史 :', ranks.history(1))
+
+# 小黑屋完整历史，之后每次同步只获取新记录
+darkroom = Archive.DarkroomArchive('darkroom.db', api)
+print('小黑屋新增记录 :', darkroom.sync())
+
+# 全文搜索存档的回复
+archive.index_thread(tid)
+print('搜索结果 :', archive.search('评分', {'tid': tid}))
+
+# 自动申请任务并领取奖励（支持多账户）
+import TaskEngine
+
+engine = TaskEngine.TaskEngine([api])
+print('任务巡检结果 :', engine.sweep_all())
+
+# 主页前10帖变化推送，区块没有变化时不解析
+import HomepageFeed
+
+feed = HomepageFeed.HomepageFeed(api, blocks=('new_post', 'new_reply', 'hot'))
+feed.poll()  # 记录当前状态
+print('主页变化 :', feed.poll())
+
+# 监听多个板块的新帖（板块fid按需修改）
+import time
+
+for thread in api.iter_new_threads([25, 61], deadline=time.time() + 60, state_file='threads.json'):
+    print('新帖 :', thread['tid'], thread['title'])
+
+# 批量点评，失败的可以单独重试
+pid = api.get_thread_info(tid)['pid']
+results = api.comment_many([(tid, pid, '点评内容')])
+failed = [(r['tid'], r['pid'], r['content']) for r in results if r['status'] == 'failed']
+
+# 定时更新帖子内容，内容没有变化时不提交
+print('编辑结果 :', api.edit_many([(tid, pid, None, '更新后的内容')]))
@@ -43,37 +43,23 @@ thread_info = api.get_thread_info(tid)
 start_time = thread_info['create_time']
 title = thread_info['title']
 pid = thread_info['pid']
-page = 1
-done_positions = [1]
-user_limit = {}
+# 额度保存到文件，脚本中途重启后不会超出每日额度和单用户奖励次数
+queue = WebAPI.RatingQueue(api, user_limit=score * user_times_limit, state_file=f'rate_{username}.json')
 reward_times_count = 0
-while True:
-    r = api.get_reply_page(tid, page)
-    replies = r['replies']
-    for i in replies:
-        if i['position'] not in done_positions:
-            if not check(i):
-                continue
-            if i['author'] not in user_limit:
-                user_limit[i['author']] = 0
-            if user_limit[i['author']] >= user_times_limit:
-                print(f'[{time.asctime()}] {i["position"]}，用户 {i["author"]} 已超过最大奖励次数: {user_times_limit}')
-                done_positions.append(i['position'])
-                continue
-            user_limit[i['author']] += 1
-            reward_times_count += 1
-            api.rate(tid, i['pid'], score,
-                     f'[{reward_times_count}] {i["position"]}楼奖励，当前用户已奖励{user_limit[i["author"]] * score}水滴')
-            print(f'[{time.asctime()}] 已奖励{i}')
-            if reward_times_count >= max_reward_times:
-                print(f'[{time.asctime()}] 已达到最大总奖励次数')
-                exit()
-    if r['hasNext']:
-        page += 1
-    if time.time() - start_time > time_limit:
-        print(f'[{time.asctime()}] 已达到时间限制')
+for i in api.watch_replies(tid, since_position=1, interval=check_interval, deadline=start_time + time_limit):
+    if not check(i):
+        continue
+    user_reward = queue.state['users'].get(str(i['uid']), 0) + score
+    queue.add(tid, i['pid'], score, f'[{reward_times_count + 1}] {i["position"]}楼奖励，当前用户已奖励{user_reward}水滴',
+              i['uid'])
+    result = queue.run()[0]
+    if result['status'] != 'success':
+        print(f'[{time.asctime()}] {i["position"]}楼，用户 {i["author"]} 未奖励: {result["message"]}')
+        continue
+    reward_times_count += 1
+    print(f'[{time.asctime()}] 已奖励{i}')
+    if reward_times_count >= max_reward_times:
+        print(f'[{time.asctime()}] 已达到最大总奖励次数')
         exit()
-    else:
-        print(f'[{time.asctime()}] 已检查{page}页，已奖励{reward_times_count}次')
-        print(f'[{time.asctime()}] 剩余时间{time_limit - (time.time() - start_time)}秒')
-    time.sleep(check_interval)
+    print(f'[{time.asctime()}] 已奖励{reward_times_count}次，剩余时间{time_limit - (time.time() - start_time)}秒')
+print(f'[{time.asctime()}] 已达到时间限制')